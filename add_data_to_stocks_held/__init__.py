@@ -1,9 +1,17 @@
 """Function to add stock data to stocks held"""
 
-import copy
 import logging
-import uuid
-from datetime import date, datetime, timedelta
+from datetime import date
+
+import numpy as np
+
+from shared_code import (
+    checkpoint_helper,
+    claim_check_helper,
+    date_time_helper,
+    sync_helper,
+    time_series_helper,
+)
 
 
 def main(payload: str) -> str:
@@ -11,39 +19,72 @@ def main(payload: str) -> str:
     logging.info("Adding stock data to stocks held")
 
     # get data
-    stocks_held_realized = payload[0]["realized"]
-    stocks_held_unrealized = payload[0]["unrealized"]
-    stock_data = payload[1]
-    forex_data = payload[2]
+    stocks_held = claim_check_helper.check_out(payload[0])
+    stocks_held_realized = stocks_held["realized"]
+    stocks_held_unrealized = stocks_held["unrealized"]
+    stock_data = claim_check_helper.check_out_values(payload[1])
+    forex_data = claim_check_helper.check_out_values(payload[2])
     symbols = payload[3]["symbols"]
     daterange = payload[3]["daterange"]
     userdata = payload[3]["user_data"]
     days_to_update = payload[4]
     userid = payload[5]
+    checkpoint = payload[6] if len(payload) > 6 else None
+    total_dividends = checkpoint["total_dividends"] if checkpoint else {}
 
     stocks = merge_realized_unrealized(
         stocks_held_realized, stocks_held_unrealized, symbols, daterange
     )
     stocks = pop_keys(stocks, ["date", "symbol", "currency"])
-    stocks = add_stock_data(symbols, stocks, stock_data, forex_data, userid, userdata)
+    stocks = add_stock_data(
+        symbols, stocks, stock_data, forex_data, userid, userdata, total_dividends
+    )
+    checkpoint = create_checkpoint(
+        stocks, payload[3], days_to_update, userid, total_dividends
+    )
     stocks = filter_output(stocks, days_to_update)
 
-    return None, None, stocks
+    return None, None, claim_check_helper.check_in(stocks), checkpoint
 
 
 def filter_output(output: list, days_to_update: int | str) -> list:
     """Filter output list"""
-    if days_to_update == "all":
+    start_date = date_time_helper.get_start_date(days_to_update)
+    if start_date is None:
         return output
 
-    end_date = date.today()
-    start_date = end_date - timedelta(days=days_to_update)
-
     filtered_output = [d for d in output if date.fromisoformat(d["date"]) >= start_date]
 
     return filtered_output
 
 
+def create_checkpoint(
+    stocks: list,
+    input_data: dict,
+    days_to_update: int | str,
+    userid: str,
+    total_dividends: dict,
+) -> dict:
+    """Create the checkpoint a later partial update can start from"""
+    checkpoint_date = checkpoint_helper.get_checkpoint_date(days_to_update)
+    total_dividends = dict(total_dividends)
+    for stock in stocks:
+        if stock["date"] <= checkpoint_date:
+            total_dividends[stock["symbol"]] = stock["realized"]["total_dividends"]
+
+    return {
+        "id": userid,
+        "userid": userid,
+        "date": checkpoint_date,
+        "fingerprint": checkpoint_helper.get_fingerprint(
+            claim_check_helper.check_out(input_data["transactions"]),
+            input_data["user_data"]["currency"],
+            checkpoint_date,
+        ),
+        "total_dividends": total_dividends,
+    }
+
+
 def add_stock_data(
     symbols: list,
     stocks_held,
@@ -51,198 +92,282 @@ def add_stock_data(
     forex_data: dict,
     userid: str,
     userdata: dict,
+    total_dividends: dict | None = None,
 ) -> list:
     """Update unrealized stock data"""
-    output = []
-    total_dividends = {}
+    if not stocks_held:
+        return []
+
+    prices = get_prices(stocks_held, stock_data, forex_data, userdata)
+    realized = get_columns(
+        stocks_held,
+        "realized",
+        [
+            "sell_price_foreign",
+            "buy_price_foreign",
+            "buy_price",
+            "average_sell_fx_rate",
+            "average_buy_fx_rate",
+            "transaction_cost",
+        ],
+    )
+    unrealized = get_columns(
+        stocks_held,
+        "unrealized",
+        [
+            "quantity",
+            "cost_per_share_foreign",
+            "average_fx_rate",
+            "total_cost",
+            "transaction_cost",
+        ],
+    )
+    row_symbols = np.array([stock["symbol"] for stock in stocks_held])
 
-    for symbol in symbols:
-        total_dividends.update({symbol: 0.0})
-
-    # initialize variables
-    for stock in stocks_held:
-        days_to_subtract = 0
-        temp_total_dividends = total_dividends[stock["symbol"]]
-        # add id
-        stock.update(
-            {
-                "userid": userid,
-                "id": str(uuid.uuid4()),
-            }
-        )
-        stock = copy.deepcopy(stock)
-        while True:
-            try:
-                date_string = f"{stock['date']} 00:00:00"
-                date_object = datetime.fromisoformat(date_string)
-                date_object = date_object - timedelta(days=days_to_subtract)
-                date_object = date_object.strftime("%Y-%m-%d")
-                stock_open = float(
-                    stock_data[stock["symbol"]]["Time Series (Daily)"][date_object][
-                        "1. open"
-                    ]
-                )
-                stock_high = float(
-                    stock_data[stock["symbol"]]["Time Series (Daily)"][date_object][
-                        "2. high"
-                    ]
-                )
-                stock_low = float(
-                    stock_data[stock["symbol"]]["Time Series (Daily)"][date_object][
-                        "3. low"
-                    ]
-                )
-                stock_close = float(
-                    stock_data[stock["symbol"]]["Time Series (Daily)"][date_object][
-                        "4. close"
-                    ]
-                )
-                if stock["currency"] == userdata["currency"]:
-                    forex_close = float(1)
-                else:
-                    forex_close = float(
-                        forex_data[stock["currency"]]["Time Series FX (Daily)"][
-                            date_object
-                        ]["4. close"]
-                    )
-
-                single_day_dividend_data = (
-                    float(
-                        stock_data[stock["symbol"]]["Time Series (Daily)"][date_object][
-                            "7. dividend amount"
-                        ]
-                    )
-                    * forex_close
-                ) * stock["unrealized"]["quantity"]
-
-                break
-            except KeyError:
-                days_to_subtract += 1
-                logging.debug(
-                    f'KeyError for {stock["symbol"]} on {date_object}. Attempting to subtract {days_to_subtract} day(s)'
-                )
-
-        temp_total_dividends += single_day_dividend_data
-        total_dividends.update({stock["symbol"]: temp_total_dividends})
-
-        stock["unrealized"].update(
-            {
-                "open_value": stock_open * forex_close,
-                "high_value": stock_high * forex_close,
-                "low_value": stock_low * forex_close,
-                "close_value": stock_close * forex_close,
-                "total_value": stock_close
-                * forex_close
-                * stock["unrealized"]["quantity"],
-                "value_pl": (
-                    stock_close * stock["unrealized"]["quantity"]
-                    - stock["unrealized"]["cost_per_share_foreign"]
-                    * stock["unrealized"]["quantity"]
-                )
-                * forex_close,
-                "forex_pl": (forex_close - stock["unrealized"]["average_fx_rate"])
-                * stock["unrealized"]["total_cost"],
-            }
+    metrics = calculate_metrics(prices, realized, unrealized)
+    metrics["realized"]["total_dividends"] = get_total_dividends(
+        metrics["realized"]["dividend"], row_symbols, symbols, total_dividends or {}
+    )
+    metrics = calculate_total_metrics(metrics, realized, unrealized)
+
+    return create_output(stocks_held, metrics, userid)
+
+
+def get_prices(
+    stocks_held: list, stock_data: dict, forex_data: dict, userdata: dict
+) -> dict:
+    """Get the prices of every stock row as arrays"""
+    price_indexes = {}
+    date_ordinals = {}
+    columns = ["open", "high", "low", "close", "dividend", "forex_close"]
+    prices = {column: np.empty(len(stocks_held)) for column in columns}
+
+    for row, stock in enumerate(stocks_held):
+        index_key = (stock["symbol"], stock["currency"])
+        if index_key not in price_indexes:
+            price_indexes[index_key] = create_price_index(
+                stock_data[stock["symbol"]],
+                None
+                if stock["currency"] == userdata["currency"]
+                else forex_data[stock["currency"]],
+            )
+        price_index = price_indexes[index_key]
+
+        if stock["date"] not in date_ordinals:
+            date_ordinals[stock["date"]] = date.fromisoformat(stock["date"]).toordinal()
+        position = get_price_index_position(
+            price_index, date_ordinals[stock["date"]], stock["symbol"]
         )
 
-        stock["realized"].update(
-            {
-                "dividend": single_day_dividend_data,
-                "total_dividends": total_dividends[stock["symbol"]],
-                "value_pl": (
-                    stock["realized"]["sell_price_foreign"]
-                    - stock["realized"]["buy_price_foreign"]
-                )
-                * stock["realized"]["average_sell_fx_rate"],
-                "transaction_cost": stock["realized"]["transaction_cost"]
-                + stock["unrealized"]["transaction_cost"],
-                "forex_pl": (
-                    stock["realized"]["average_sell_fx_rate"]
-                    - stock["realized"]["average_buy_fx_rate"]
-                )
-                * stock["realized"]["buy_price"],
-            }
+        for column in columns:
+            prices[column][row] = price_index[column][position]
+
+    return prices
+
+
+def get_columns(stocks_held: list, key: str, fields: list) -> dict:
+    """Get fields of the realized or unrealized stock data as arrays"""
+    return {
+        field: np.array([stock[key][field] for stock in stocks_held], dtype=float)
+        for field in fields
+    }
+
+
+def calculate_metrics(prices: dict, realized: dict, unrealized: dict) -> dict:
+    """Calculate the value, forex and dividend metrics of every stock row"""
+    forex_close = prices["forex_close"]
+    quantity = unrealized["quantity"]
+
+    unrealized_metrics = {
+        "open_value": prices["open"] * forex_close,
+        "high_value": prices["high"] * forex_close,
+        "low_value": prices["low"] * forex_close,
+        "close_value": prices["close"] * forex_close,
+        "total_value": prices["close"] * forex_close * quantity,
+        "value_pl": (
+            prices["close"] * quantity - unrealized["cost_per_share_foreign"] * quantity
         )
+        * forex_close,
+        "forex_pl": (forex_close - unrealized["average_fx_rate"])
+        * unrealized["total_cost"],
+    }
 
-        stock["unrealized"].pop("transaction_cost", None)
+    realized_metrics = {
+        "dividend": (prices["dividend"] * forex_close) * quantity,
+        "total_dividends": None,
+        "value_pl": (realized["sell_price_foreign"] - realized["buy_price_foreign"])
+        * realized["average_sell_fx_rate"],
+        "transaction_cost": realized["transaction_cost"]
+        + unrealized["transaction_cost"],
+        "forex_pl": (realized["average_sell_fx_rate"] - realized["average_buy_fx_rate"])
+        * realized["buy_price"],
+    }
 
-        stock["realized"].update(
-            {
-                "total_pl": stock["realized"]["value_pl"]
-                + stock["realized"]["forex_pl"]
-                + stock["realized"]["dividend"]
-                + total_dividends[stock["symbol"]]
-                - stock["realized"]["transaction_cost"]
-            }
+    return {"realized": realized_metrics, "unrealized": unrealized_metrics}
+
+
+def get_total_dividends(
+    dividends: np.ndarray,
+    row_symbols: np.ndarray,
+    symbols: list,
+    start_total_dividends: dict,
+) -> np.ndarray:
+    """Get the running total of dividends per symbol"""
+    total_dividends = np.zeros(len(dividends))
+    for symbol in symbols:
+        symbol_rows = row_symbols == symbol
+        total_dividends[symbol_rows] = np.cumsum(
+            np.concatenate(
+                ([start_total_dividends.get(symbol, 0.0)], dividends[symbol_rows])
+            )
+        )[1:]
+    return total_dividends
+
+
+def calculate_total_metrics(metrics: dict, realized: dict, unrealized: dict) -> dict:
+    """Calculate the total and percentage metrics of every stock row"""
+    realized_metrics = metrics["realized"]
+    unrealized_metrics = metrics["unrealized"]
+    buy_price = realized["buy_price"]
+    total_cost = unrealized["total_cost"]
+
+    realized_metrics["total_pl"] = (
+        realized_metrics["value_pl"]
+        + realized_metrics["forex_pl"]
+        + realized_metrics["dividend"]
+        + realized_metrics["total_dividends"]
+        - realized_metrics["transaction_cost"]
+    )
+    realized_metrics.update(
+        {
+            "value_pl_percentage": divide(realized_metrics["value_pl"], buy_price),
+            "forex_pl_percentage": divide(realized_metrics["forex_pl"], buy_price),
+            "total_pl_percentage": np.where(
+                buy_price == 0,
+                divide(realized_metrics["total_pl"], unrealized_metrics["total_value"]),
+                divide(realized_metrics["total_pl"], buy_price),
+            ),
+        }
+    )
+
+    unrealized_metrics["total_pl"] = unrealized_metrics["total_value"] - total_cost
+    unrealized_metrics.update(
+        {
+            "total_pl_percentage": divide(
+                unrealized_metrics["total_value"] - total_cost, total_cost
+            ),
+            "value_pl_percentage": divide(unrealized_metrics["value_pl"], total_cost),
+            "forex_pl_percentage": divide(unrealized_metrics["forex_pl"], total_cost),
+        }
+    )
+
+    combined_metrics = {
+        "value_pl": realized_metrics["value_pl"] + unrealized_metrics["value_pl"],
+        "forex_pl": realized_metrics["forex_pl"] + unrealized_metrics["forex_pl"],
+        "total_pl": realized_metrics["total_pl"] + unrealized_metrics["total_pl"],
+    }
+    total_invested = total_cost + buy_price
+    combined_metrics.update(
+        {
+            "value_pl_percentage": divide(combined_metrics["value_pl"], total_invested),
+            "forex_pl_percentage": divide(combined_metrics["forex_pl"], total_invested),
+            "dividend_pl_percentage": divide(
+                realized_metrics["total_dividends"], total_invested
+            ),
+            "transaction_cost_percentage": divide(
+                realized_metrics["transaction_cost"], total_invested
+            ),
+            "total_pl_percentage": divide(combined_metrics["total_pl"], total_invested),
+        }
+    )
+
+    metrics["combined"] = combined_metrics
+    return metrics
+
+
+def divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide arrays, returning 0.0 where the denominator is 0"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator == 0, 0.0, numerator / denominator)
+
+
+def create_output(stocks_held: list, metrics: dict, userid: str) -> list:
+    """Convert the stock rows and their metrics to output documents"""
+    metrics = {
+        key: {field: values.tolist() for field, values in fields.items()}
+        for key, fields in metrics.items()
+    }
+    output = []
+
+    for row, stock in enumerate(stocks_held):
+        realized = {**stock["realized"]}
+        realized.update(
+            {field: values[row] for field, values in metrics["realized"].items()}
         )
-        stock["realized"].update(
-            {
-                "value_pl_percentage": 0.0
-                if stock["realized"]["buy_price"] == 0
-                else (stock["realized"]["value_pl"] / stock["realized"]["buy_price"]),
-                "forex_pl_percentage": 0.0
-                if stock["realized"]["buy_price"] == 0
-                else (stock["realized"]["forex_pl"] / stock["realized"]["buy_price"]),
-                "total_pl_percentage": stock["realized"]["total_pl"]
-                / stock["unrealized"]["total_value"]
-                if stock["realized"]["buy_price"] == 0
-                else (stock["realized"]["total_pl"] / stock["realized"]["buy_price"]),
-            }
+        unrealized = {
+            key: value
+            for key, value in stock["unrealized"].items()
+            if key != "transaction_cost"
+        }
+        unrealized.update(
+            {field: values[row] for field, values in metrics["unrealized"].items()}
         )
 
-        stock["unrealized"].update(
+        output.append(
             {
-                "total_pl": stock["unrealized"]["total_value"]
-                - stock["unrealized"]["total_cost"],
-                "total_pl_percentage": 0.0
-                if stock["unrealized"]["total_cost"] == 0
-                else (
-                    stock["unrealized"]["total_value"]
-                    - stock["unrealized"]["total_cost"]
-                )
-                / stock["unrealized"]["total_cost"],
-                "value_pl_percentage": 0.0
-                if stock["unrealized"]["total_cost"] == 0
-                else (
-                    stock["unrealized"]["value_pl"] / stock["unrealized"]["total_cost"]
-                ),
-                "forex_pl_percentage": 0.0
-                if stock["unrealized"]["total_cost"] == 0
-                else (
-                    stock["unrealized"]["forex_pl"] / stock["unrealized"]["total_cost"]
+                **stock,
+                "realized": realized,
+                "unrealized": unrealized,
+                "combined": {
+                    field: values[row] for field, values in metrics["combined"].items()
+                },
+                "userid": userid,
+                "id": sync_helper.get_document_id(
+                    userid, "stocks_held", stock["date"], stock["symbol"]
                 ),
             }
         )
 
-        stock["combined"].update(
-            {
-                "value_pl": stock["realized"]["value_pl"]
-                + stock["unrealized"]["value_pl"],
-                "forex_pl": stock["realized"]["forex_pl"]
-                + stock["unrealized"]["forex_pl"],
-                "total_pl": stock["realized"]["total_pl"]
-                + stock["unrealized"]["total_pl"],
-            }
-        )
-        stock["combined"].update(
-            {
-                "value_pl_percentage": stock["combined"]["value_pl"]
-                / (stock["unrealized"]["total_cost"] + stock["realized"]["buy_price"]),
-                "forex_pl_percentage": stock["combined"]["forex_pl"]
-                / (stock["unrealized"]["total_cost"] + stock["realized"]["buy_price"]),
-                "dividend_pl_percentage": stock["realized"]["total_dividends"]
-                / (stock["unrealized"]["total_cost"] + stock["realized"]["buy_price"]),
-                "transaction_cost_percentage": stock["realized"]["transaction_cost"]
-                / (stock["unrealized"]["total_cost"] + stock["realized"]["buy_price"]),
-                "total_pl_percentage": stock["combined"]["total_pl"]
-                / (stock["unrealized"]["total_cost"] + stock["realized"]["buy_price"]),
-            }
-        )
-
-        output.append(stock)
     return output
 
 
+def create_price_index(time_series: dict, forex_time_series: dict | None) -> dict:
+    """Create a price index with the prices of every date with stock and forex data"""
+    positions = range(len(time_series["dates"]))
+    if forex_time_series is not None:
+        forex_positions = {d: i for i, d in enumerate(forex_time_series["dates"])}
+        positions = [i for i in positions if time_series["dates"][i] in forex_positions]
+    dates = [time_series["dates"][i] for i in positions]
+    if not dates:
+        return {"first_ordinal": None, "positions": []}
+
+    columns = time_series["columns"]
+    return {
+        "first_ordinal": date.fromisoformat(dates[0]).toordinal(),
+        "positions": time_series_helper.get_as_of_positions(dates),
+        "open": [columns["open"][i] for i in positions],
+        "high": [columns["high"][i] for i in positions],
+        "low": [columns["low"][i] for i in positions],
+        "close": [columns["close"][i] for i in positions],
+        "dividend": [columns["dividend_amount"][i] for i in positions],
+        "forex_close": [float(1)] * len(dates)
+        if forex_time_series is None
+        else [forex_time_series["columns"]["close"][forex_positions[d]] for d in dates],
+    }
+
+
+def get_price_index_position(price_index: dict, ordinal: int, symbol: str) -> int:
+    """Get the position of the most recent prices on or before a date ordinal"""
+    if not price_index["positions"] or ordinal < price_index["first_ordinal"]:
+        raise KeyError(
+            f"No stock data for {symbol} on or before {date.fromordinal(ordinal)}"
+        )
+    offset = min(
+        ordinal - price_index["first_ordinal"], len(price_index["positions"]) - 1
+    )
+    return price_index["positions"][offset]
+
+
 def merge_realized_unrealized(
     realized: list, unrealized: list, symbols: list, daterange: list
 ) -> list:
@@ -280,11 +405,14 @@ def merge_realized_unrealized(
         "currency": "",
     }
 
+    realized_by_symbol_and_date = index_by_symbol_and_date(realized)
+    unrealized_by_symbol_and_date = index_by_symbol_and_date(unrealized)
+
     for single_date in daterange:
         for symbol in symbols:
             output_object = create_merged_object(
-                realized,
-                unrealized,
+                realized_by_symbol_and_date.get((symbol, single_date)),
+                unrealized_by_symbol_and_date.get((symbol, single_date)),
                 symbol,
                 single_date,
                 empty_unrealized,
@@ -296,31 +424,33 @@ def merge_realized_unrealized(
     return output
 
 
+def index_by_symbol_and_date(items: list) -> dict:
+    """Index items by symbol and date, keeping the first item of every pair"""
+    output = {}
+    for item in items:
+        output.setdefault((item["symbol"], item["date"]), item)
+    return output
+
+
 def create_merged_object(
-    realized: list,
-    unrealized: list,
+    single_realized: dict | None,
+    single_unrealized: dict | None,
     symbol: str,
     single_date: str,
     empty_unrealized: dict,
     empty_realized: dict,
 ):
     """Create merged object"""
-    single_realized = [
-        d for d in realized if d["symbol"] == symbol and d["date"] == single_date
-    ]
-    single_unrealized = [
-        d for d in unrealized if d["symbol"] == symbol and d["date"] == single_date
-    ]
     if not single_realized and not single_unrealized:
         return
     if single_realized and not single_unrealized:
         output_object = {
             "date": single_date,
             "symbol": symbol,
-            "currency": single_realized[0]["currency"],
+            "currency": single_realized["currency"],
             "fully_realized": True,
             "partial_realized": False,
-            "realized": single_realized[0],
+            "realized": single_realized,
             "unrealized": empty_unrealized,
             "combined": {},
         }
@@ -328,22 +458,22 @@ def create_merged_object(
         output_object = {
             "date": single_date,
             "symbol": symbol,
-            "currency": single_unrealized[0]["currency"],
+            "currency": single_unrealized["currency"],
             "fully_realized": False,
             "partial_realized": False,
             "realized": empty_realized,
-            "unrealized": single_unrealized[0],
+            "unrealized": single_unrealized,
             "combined": {},
         }
     if single_realized and single_unrealized:
         output_object = {
             "date": single_date,
             "symbol": symbol,
-            "currency": single_realized[0]["currency"],
+            "currency": single_realized["currency"],
             "fully_realized": False,
             "partial_realized": True,
-            "realized": single_realized[0],
-            "unrealized": single_unrealized[0],
+            "realized": single_realized,
+            "unrealized": single_unrealized,
             "combined": {},
         }
 
@@ -1,23 +1,43 @@
 """"Function to calculate totals"""
 
 import logging
-import uuid
+
+from shared_code import claim_check_helper, date_time_helper, sync_helper, utils
+
+REALIZED_FIELDS = {
+    "total_dividends": "dividends",
+    "transaction_cost": "transaction_cost",
+    "value_pl": "value_pl",
+    "forex_pl": "forex_pl",
+    "total_pl": "total_pl",
+}
+UNREALIZED_FIELDS = ["total_cost", "total_value", "value_pl", "forex_pl", "total_pl"]
+OUTPUT_BATCH_SIZE = 5000
 
 
 def main(payload: str) -> str:
     """Calculate totals"""
     logging.info("Calculating totals")
 
-    stocks_held = payload[0]
-    invested = payload[1]
+    stocks_held = claim_check_helper.check_out(payload[0])
+    invested = claim_check_helper.check_out(payload[1])
     daterange = payload[2]["daterange"]
     userid = payload[3]
+    days_to_update = payload[4] if len(payload) > 4 else "all"
+
+    start_date = date_time_helper.get_start_date(days_to_update)
+    if start_date is not None:
+        start_date = start_date.strftime("%Y-%m-%d")
+        daterange = [d for d in daterange if d >= start_date]
 
     output = []
+    stocks_held_by_date = utils.group_items(stocks_held, "date")
+    invested_by_date = utils.group_items(invested, "date")
+
     # loop through dates
     for single_date in daterange:
-        stocks_single_date = [d for d in stocks_held if d["date"] == single_date]
-        invested_single_date = [d for d in invested if d["date"] == single_date]
+        stocks_single_date = stocks_held_by_date.get(single_date, [])
+        invested_single_date = invested_by_date.get(single_date, [])
 
         totals = create_totals_object(
             stocks_single_date, invested_single_date, userid, single_date
@@ -27,7 +47,20 @@ def main(payload: str) -> str:
 
         output.append(totals)
 
-    return None, None, {"stocks_held": stocks_held, "totals": output}
+    # the hashes are taken last, after the stock weights are added
+    sync_helper.add_content_hash(stocks_held)
+    sync_helper.add_content_hash(output)
+
+    return (
+        None,
+        None,
+        {
+            "stocks_held": claim_check_helper.check_in_batches(
+                stocks_held, OUTPUT_BATCH_SIZE
+            ),
+            "totals": claim_check_helper.check_in_batches(output, OUTPUT_BATCH_SIZE),
+        },
+    )
 
 
 def create_totals_object(
@@ -35,26 +68,22 @@ def create_totals_object(
 ) -> dict:
     """Create totals object"""
 
+    realized = dict.fromkeys(REALIZED_FIELDS.values(), 0)
+    unrealized = dict.fromkeys(UNREALIZED_FIELDS, 0)
+    for stock in stocks:
+        for stock_field, total_field in REALIZED_FIELDS.items():
+            realized[total_field] += stock["realized"][stock_field]
+        for field in UNREALIZED_FIELDS:
+            unrealized[field] += stock["unrealized"][field]
+
     totals = {
         "date": single_date,
         "total_invested": invested[0]["invested"] if invested else 1,
-        "realized": {
-            "dividends": sum(d["realized"]["total_dividends"] for d in stocks),
-            "transaction_cost": sum(d["realized"]["transaction_cost"] for d in stocks),
-            "value_pl": sum(d["realized"]["value_pl"] for d in stocks),
-            "forex_pl": sum(d["realized"]["forex_pl"] for d in stocks),
-            "total_pl": sum(d["realized"]["total_pl"] for d in stocks),
-        },
-        "unrealized": {
-            "total_cost": sum(d["unrealized"]["total_cost"] for d in stocks),
-            "total_value": sum(d["unrealized"]["total_value"] for d in stocks),
-            "value_pl": sum(d["unrealized"]["value_pl"] for d in stocks),
-            "forex_pl": sum(d["unrealized"]["forex_pl"] for d in stocks),
-            "total_pl": sum(d["unrealized"]["total_pl"] for d in stocks),
-        },
+        "realized": realized,
+        "unrealized": unrealized,
         "combined": {},
         "userid": userid,
-        "id": str(uuid.uuid4()),
+        "id": sync_helper.get_document_id(userid, "totals", single_date),
     }
 
     totals["combined"].update(
@@ -1,39 +1,261 @@
 """Call alphavantage API"""
 
+import asyncio
+import codecs
+import json
 import logging
-import time
+import re
 
-import requests
+import aiohttp
 
+from shared_code import (
+    aio_helper,
+    claim_check_helper,
+    fx_helper,
+    get_config,
+    market_data_helper,
+    rate_limit_helper,
+    time_series_cache,
+    time_series_helper,
+)
 
-def main(payload: str) -> str:
-    """Get data from API"""
+# time out on connecting and on each read, a full history can take longer to stream
+TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+TIME_SERIES_START = re.compile(r'"(Time Series[^"]*)"\s*:\s*\{')
+TIME_SERIES_DAY = re.compile(r'\s*,?\s*"(\d{4}-\d{2}-\d{2})"\s*:\s*(\{[^{}]*\})')
 
-    url, api_key = payload
-    url = f"{url}&apikey={api_key}"
+
+async def main(payload: list[str | list[str | dict], str, str]) -> dict | list:
+    """Get time series from API for one url or concurrently for a list of requests"""
+
+    api_requests, api_key = payload[:2]
+    plan = payload[2] if len(payload) > 2 else rate_limit_helper.DEFAULT_PLAN
+    if isinstance(api_requests, str):
+        return await get_data(api_requests, api_key, plan)
+
+    # requests for the same url share a single download
+    api_requests = [
+        {"url": api_request} if isinstance(api_request, str) else api_request
+        for api_request in api_requests
+    ]
+    oldest_dates = get_oldest_dates(api_requests)
+    data = dict(
+        zip(
+            oldest_dates,
+            await aio_helper.gather_with_concurrency(
+                rate_limit_helper.get_concurrency(plan),
+                *(
+                    get_data(url, api_key, plan, oldest_date)
+                    for url, oldest_date in oldest_dates.items()
+                ),
+            ),
+        )
+    )
+
+    return [
+        await asyncio.to_thread(
+            claim_check_helper.check_in,
+            prepare_data(get_request_data(api_request, data), api_request),
+        )
+        for api_request in api_requests
+    ]
+
+
+def get_urls(api_request: dict) -> list[str]:
+    """Get the urls to download for a request, a currency pair needs the rates of both against the pivot currency"""
+    if "url" in api_request:
+        return [api_request["url"]]
+    return fx_helper.get_pivot_urls(api_request["currency"], api_request["to_currency"])
+
+
+def get_oldest_dates(api_requests: list[dict]) -> dict:
+    """Get the oldest date needed of every url to download, None when a request needs the full history"""
+    oldest_dates = {}
+    for api_request in api_requests:
+        for url in get_urls(api_request):
+            oldest_date = api_request.get("oldest_date")
+            if url not in oldest_dates:
+                oldest_dates[url] = oldest_date
+            elif None in (oldest_dates[url], oldest_date):
+                oldest_dates[url] = None
+            else:
+                oldest_dates[url] = min(oldest_dates[url], oldest_date)
+    return oldest_dates
+
+
+def get_request_data(api_request: dict, data: dict) -> dict:
+    """Get the time series of a request from the downloaded data"""
+    if "url" in api_request:
+        return data[api_request["url"]]
+    return fx_helper.get_cross_rate(
+        api_request["currency"],
+        api_request["to_currency"],
+        data,
+        api_request["oldest_date"],
+    )
+
+
+def prepare_data(data: dict, api_request: dict) -> dict:
+    """Filter the time series of a request"""
+    if "oldest_date" in api_request:
+        data = time_series_helper.filter_columns(data, api_request["oldest_date"])
+    return data
+
+
+async def get_data(
+    url: str, api_key: str, plan: str, oldest_date: str | None = None
+) -> dict:
+    """Get the columnar time series of a single url from the shared market data, the cache or the API"""
+    cache_key = time_series_cache.get_cache_key(url)
+    if cache_key is None:
+        return await call_api(url, api_key, plan)
+
+    # use the shared market data when another run already updated it today
+    market_data = await asyncio.to_thread(
+        market_data_helper.read_market_data, cache_key
+    )
+    if (
+        market_data is not None
+        and market_data_helper.is_fresh(market_data)
+        and time_series_helper.covers(market_data, oldest_date)
+    ):
+        logging.info(f"Using shared market data for {cache_key}")
+        return market_data_helper.get_columns(market_data)
+
+    if market_data is not None:
+        cached = market_data_helper.get_columns(market_data)
+    else:
+        cached = await asyncio.to_thread(get_local_cache, url)
+
+    # only fetch the latest days when the cached history is old enough and recent enough
+    data = None
+    cutoff = time_series_helper.get_shared_cutoff(cached, oldest_date)
+    if (
+        cached is not None
+        and time_series_helper.covers(cached, oldest_date)
+        and time_series_cache.is_recent(cached)
+    ):
+        update = await get_time_series(
+            time_series_cache.get_compact_url(url), api_key, plan
+        )
+        data = time_series_cache.merge_time_series(cached, update)
+        if data is None:
+            logging.info("Cached time series is out of date, getting full time series")
+    if data is None:
+        data = await get_time_series(url, api_key, plan, cutoff)
+
+    await asyncio.to_thread(save_cache, cache_key, url, data)
+    return data
+
+
+async def get_time_series(
+    url: str, api_key: str, plan: str, cutoff: str | None = None
+) -> dict:
+    """Get a time series from the api, parsed once into columns"""
+    data = await call_api(url, api_key, plan, cutoff)
+    if time_series_helper.get_time_series_key(data) is None:
+        raise Exception(f"Error: no time series in response {data}")
+    return time_series_helper.to_columns(data)
+
+
+def save_cache(cache_key: str, url: str, data: dict) -> None:
+    """Save the time series to the shared market data and the local cache"""
+    market_data_helper.write_market_data(cache_key, data)
+    cache_dir = get_config.get_time_series_cache_dir()
+    if cache_dir is not None:
+        time_series_cache.save_time_series(
+            time_series_cache.get_cache_path(cache_dir, url), data
+        )
+
+
+def get_local_cache(url: str) -> dict | None:
+    """Get the time series from the local cache if it is enabled"""
+    cache_dir = get_config.get_time_series_cache_dir()
+    if cache_dir is None:
+        return None
+    return time_series_cache.load_time_series(
+        time_series_cache.get_cache_path(cache_dir, url)
+    )
+
+
+async def call_api(
+    url: str, api_key: str, plan: str, cutoff: str | None = None
+) -> dict:
+    """Call the api paced by the rate limit of the plan, retrying on errors"""
+    key_url = f"{url}&apikey={api_key}"
+    session = aio_helper.get_session()
 
     error_counter = 0
     while True:
+        await rate_limit_helper.acquire(api_key, plan)
         logging.info(f"Calling API: {url}")
-        data = requests.get(url, timeout=10)
+        logging.debug(
+            f"Remaining api calls: {rate_limit_helper.get_remaining(api_key, plan)}"
+        )
+        try:
+            async with session.get(key_url, timeout=TIMEOUT) as response:
+                error = None if response.status == 200 else response.status
+                data = None if error else await read_response(response, cutoff)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as exception:
+            error = repr(exception)
 
-        if data.status_code != 200:
+        if error is not None:
             error_counter += 1
             if error_counter > 3:
-                raise Exception(f"Error: {data.status_code}")
-            logging.error(f"Error: {data.status_code}")
+                raise Exception(f"Error: {error}")
+            logging.error(f"Error: {error}")
             logging.info("Retrying in 30 seconds")
-            time.sleep(30)
+            await asyncio.sleep(30)
             logging.info("Retrying")
             continue
 
-        if "Note" in data.json():
+        if "Note" in data:
             error_counter += 1
             if error_counter > 18:
                 raise Exception("Too many api calls, Exiting.")
             logging.warning("To many api calls, Waiting for 10 seconds")
-            time.sleep(10)
+            await asyncio.sleep(10)
             logging.info("Retrying")
             continue
 
-        return data.json()
+        return data
+
+
+async def read_response(
+    response: aiohttp.ClientResponse, cutoff: str | None = None
+) -> dict:
+    """Read the json of a response, streaming a time series and dropping the days before a cutoff date"""
+    if cutoff is None:
+        return await response.json(content_type=None)
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    meta_data = None
+    key = None
+    time_series = {}
+    async for chunk in response.content.iter_any():
+        text += decoder.decode(chunk)
+
+        # the meta data is followed by the days of the time series, newest first
+        if key is None:
+            match = TIME_SERIES_START.search(text)
+            if match is None:
+                continue
+            meta_data = json.loads(f"{text[:match.start()].rstrip().rstrip(',')}}}")
+            key = match.group(1)
+            text = text[match.end() :]
+
+        position = 0
+        while match := TIME_SERIES_DAY.match(text, position):
+            if match.group(1) < cutoff:
+                return {
+                    "Meta Data": {**meta_data, "cutoff": cutoff},
+                    key: time_series,
+                }
+            time_series[match.group(1)] = json.loads(match.group(2))
+            position = match.end()
+        text = text[position:]
+
+    if key is None:
+        return json.loads(text + decoder.decode(b"", final=True))
+    return {"Meta Data": {**meta_data, "cutoff": cutoff}, key: time_series}
@@ -1,9 +1,8 @@
 """Function to delete CosmosDB items"""
 
 import logging
-from functools import partial
 
-from shared_code import aio_helper, cosmosdb_module
+from shared_code import cosmosdb_module
 
 
 async def main(payload: list[str, list]) -> str:
@@ -18,17 +17,10 @@ async def main(payload: list[str, list]) -> str:
     container_name: str = payload[0]
     items: list = payload[1]
 
-    container_client = cosmosdb_module.cosmosdb_container(container_name)
+    container_client = cosmosdb_module.cosmosdb_async_container(container_name)
 
-    tasks = []
+    def delete_item(item: dict, **kwargs):
+        return container_client.delete_item(item, partition_key=item["id"], **kwargs)
 
-    for item in items:
-        logging.debug(item)
-        tasks.append(
-            cosmosdb_module.container_function_with_back_off(
-                partial(container_client.delete_item, item, partition_key=item["id"])
-            )
-        )
-    await aio_helper.gather_with_concurrency(50, *tasks)
-
-    return '{"status": "Done"}'
+    report = await cosmosdb_module.write_concurrently(delete_item, items)
+    return cosmosdb_module.get_write_result(container_name, report)
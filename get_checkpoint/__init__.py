@@ -0,0 +1,65 @@
+"""Function to get the checkpoint of a user"""
+
+import logging
+
+from azure.cosmos import exceptions
+
+from shared_code import (
+    checkpoint_helper,
+    claim_check_helper,
+    cosmosdb_module,
+    date_time_helper,
+)
+
+
+def main(payload: list[str, dict, str | int]) -> dict | None:
+    """Get the checkpoint a partial update can start from"""
+    logging.info("Getting checkpoint")
+
+    # suppress logger output
+    logger = logging.getLogger("azure")
+    logger.setLevel(logging.CRITICAL)
+
+    # get config
+    userid: str = payload[0]
+    input_data: dict = payload[1]
+    days_to_update: str | int = payload[2]
+
+    start_date = date_time_helper.get_start_date(days_to_update)
+    if start_date is None:
+        return None
+
+    container_client = cosmosdb_module.cosmosdb_container("checkpoints")
+    try:
+        checkpoints = list(
+            container_client.query_items(
+                query="SELECT * FROM c WHERE c.userid = @userid",
+                parameters=[{"name": "@userid", "value": userid}],
+                enable_cross_partition_query=True,
+            )
+        )
+    except exceptions.CosmosResourceNotFoundError:
+        logging.warning("Checkpoints container not found, updating all dates")
+        return None
+    if not checkpoints:
+        logging.info("No checkpoint found")
+        return None
+
+    checkpoint = checkpoints[0]
+    if checkpoint["date"] >= start_date.strftime("%Y-%m-%d"):
+        logging.info("Checkpoint is not before the first date to update")
+        return None
+
+    fingerprint = checkpoint_helper.get_fingerprint(
+        claim_check_helper.check_out(input_data["transactions"]),
+        input_data["user_data"]["currency"],
+        checkpoint["date"],
+    )
+    if fingerprint != checkpoint["fingerprint"]:
+        logging.info("Transactions changed since the checkpoint")
+        return None
+
+    return {
+        "date": checkpoint["date"],
+        "total_dividends": checkpoint["total_dividends"],
+    }
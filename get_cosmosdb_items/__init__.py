@@ -1,7 +1,6 @@
 """Function to delete CosmosDB items"""
 
 import logging
-from datetime import date, timedelta
 
 from shared_code import cosmosdb_module
 
@@ -19,20 +18,7 @@ def main(payload: list[str | int, str]) -> str:
     userid: str = payload[1]
     containers: list[str] = payload[2]
 
-    if days_to_update == "all":
-        query = "SELECT * FROM c WHERE c.userid = @userid"
-        parameters = [{"name": "@userid", "value": userid}]
-    else:
-        today = date.today()
-        end_date = today.strftime("%Y-%m-%d")
-        start_date = (today - timedelta(days=days_to_update)).strftime("%Y-%m-%d")
-
-        query = "SELECT * FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.userid = @userid"
-        parameters = [
-            {"name": "@start_date", "value": start_date},
-            {"name": "@end_date", "value": end_date},
-            {"name": "@userid", "value": userid},
-        ]
+    query, parameters = cosmosdb_module.get_user_items_query(days_to_update, userid)
 
     data = {}
 
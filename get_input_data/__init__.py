@@ -5,7 +5,7 @@ from datetime import date
 
 import pandas as pd
 
-from shared_code import cosmosdb_module, utils
+from shared_code import claim_check_helper, cosmosdb_module, utils
 
 
 def main(payload: str) -> dict:
@@ -38,16 +38,30 @@ def main(payload: str) -> dict:
     start_date = transactions[0]["date"]
     daterange = [d.strftime("%Y-%m-%d") for d in pd.date_range(start_date, end_date)]
     symbols = utils.get_unique_items(transactions, "symbol")
+    currencies = utils.get_unique_items(transactions, "currency")
 
     return {
-        "transactions": transactions,
-        "invested": invested,
+        "transactions": claim_check_helper.check_in(transactions),
+        "invested": claim_check_helper.check_in(invested),
         "daterange": daterange,
         "symbols": symbols,
+        "currencies": currencies,
+        "first_dates": {
+            "symbols": get_first_dates(transactions, "symbol"),
+            "currencies": get_first_dates(transactions, "currency"),
+        },
         "user_data": user_data,
     }
 
 
+def get_first_dates(transactions: list, key: str) -> dict:
+    """Get the date of the first transaction of every value of a key"""
+    first_dates = {}
+    for transaction in transactions:
+        first_dates.setdefault(transaction[key], transaction["date"])
+    return first_dates
+
+
 def get_cosmosdb_items(
     query: str, parameters: list, container_name: str, keys_to_pop: list
 ):
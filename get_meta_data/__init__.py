@@ -1,73 +1,123 @@
 """Get meta data from the API"""
 
+import asyncio
 import logging
 import uuid
-from datetime import date, timedelta
 
-import requests
+import aiohttp
 
+from shared_code import aio_helper, claim_check_helper, company_data_helper
 
-def main(payload: str):
-    """Get stock meta data from the API"""
+MAX_CONCURRENT_DOMAINS = 10
+TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+
+async def main(payload: str):
+    """Get stock meta data from the shared company data or the API"""
 
     logging.info("Getting stock meta data")
 
     symbols = payload[0]
-    transactions = payload[1]
+    transactions = claim_check_helper.check_out(payload[1])
     clearbit_api_key = payload[2]["clearbit_api_key"]
     brandfetch_api_key = payload[2]["brandfetch_api_key"]
     userid = payload[3]
 
-    # initialize variables
-    output = []
+    domains = get_domains(transactions)
+
+    # symbols of the same company share a single lookup
+    unique_domains = list(dict.fromkeys(domains[symbol] for symbol in symbols))
+    company_data = dict(
+        zip(
+            unique_domains,
+            await aio_helper.gather_with_concurrency(
+                MAX_CONCURRENT_DOMAINS,
+                *(
+                    get_company_data(domain, clearbit_api_key, brandfetch_api_key)
+                    for domain in unique_domains
+                ),
+            ),
+        )
+    )
+
+    return [
+        {
+            "symbol": symbol,
+            **company_data_helper.get_fields(company_data[domains[symbol]]),
+            "id": str(uuid.uuid4()),
+            "expiry": company_data[domains[symbol]]["expiry"],
+            "userid": userid,
+        }
+        for symbol in symbols
+    ]
+
+
+def get_domains(transactions: list) -> dict:
+    """Get the domain of every symbol from its first transaction"""
+    domains = {}
+    for transaction in transactions:
+        domains.setdefault(transaction["symbol"], transaction["domain"])
+    return domains
+
 
-    for symbol in symbols:
-        domain = [x for x in transactions if x["symbol"] == symbol]
-        domain = domain[0]["domain"]
+async def get_company_data(
+    domain: str, clearbit_api_key: str, brandfetch_api_key: str
+) -> dict:
+    """Get the company data of a domain from the shared store or both APIs"""
+    item = await asyncio.to_thread(company_data_helper.read_company_data, domain)
+    if item is not None and company_data_helper.is_fresh(item):
+        logging.info(f"Using shared company data for {domain}")
+        return item
 
-        clearbit_data = call_clearbit_api(
+    clearbit_data, brandfetch_data = await asyncio.gather(
+        call_clearbit_api(
             f"https://company.clearbit.com/v2/companies/find?domain={domain}",
             clearbit_api_key,
-        )
-        brandfetch_data = call_brandfetch_api(
+        ),
+        call_brandfetch_api(
             f"https://api.brandfetch.io/v2/brands/{domain}", brandfetch_api_key
-        )
+        ),
+    )
+    data = {
+        **get_clearbit_fields(clearbit_data or {}),
+        "domain": domain,
+        **get_brandfetch_fields(brandfetch_data or {}),
+    }
 
-        logos = filtered_logos(brandfetch_data.get("logos", []))
-        images = filtered_images(brandfetch_data.get("images", []))
+    # incomplete data is not shared and is already expired, so the next run retries
+    if clearbit_data is None or brandfetch_data is None:
+        return {**data, "expiry": company_data_helper.get_expiry(-1)}
+    return await asyncio.to_thread(company_data_helper.write_company_data, domain, data)
 
-        temp_object = {
-            "symbol": symbol,
-            "name": clearbit_data.get("name", None),
-            "description": clearbit_data.get("description", None),
-            "country": clearbit_data.get("geo", {}).get("country", None),
-            "sector": clearbit_data.get("category", {}).get("sector", None),
-            "domain": domain,
-            "links": brandfetch_data.get("links", None),
-            "id": str(uuid.uuid4()),
-            "expiry": (date.today() + timedelta(days=30)).strftime("%Y-%m-%d"),
-            "userid": userid,
-        }
 
-        temp_object.update(logos)
-        temp_object.update(images)
+def get_clearbit_fields(clearbit_data: dict) -> dict:
+    """Get the company fields of a clearbit response"""
+    return {
+        "name": clearbit_data.get("name", None),
+        "description": clearbit_data.get("description", None),
+        "country": clearbit_data.get("geo", {}).get("country", None),
+        "sector": clearbit_data.get("category", {}).get("sector", None),
+    }
 
-        output.append(temp_object)
-    return output
 
+def get_brandfetch_fields(brandfetch_data: dict) -> dict:
+    """Get the company fields of a brandfetch response"""
+    return {
+        "links": brandfetch_data.get("links", None),
+        **filtered_logos(brandfetch_data.get("logos", [])),
+        **filtered_images(brandfetch_data.get("images", [])),
+    }
 
-def call_clearbit_api(url: str, clearbit_api_key: str) -> dict:
+
+async def call_clearbit_api(url: str, clearbit_api_key: str) -> dict:
     """Call the clearbit API"""
     logging.info(f"Calling Clearbit API: {url}")
 
     headers = {"Authorization": f"Bearer {clearbit_api_key}"}
-    response = requests.get(url, headers=headers, timeout=10)
-    if response.status_code == 200:
-        return response.json()
-    return None
+    return await call_api(url, headers)
 
 
-def call_brandfetch_api(url: str, brandfetch_api_key: str) -> dict:
+async def call_brandfetch_api(url: str, brandfetch_api_key: str) -> dict:
     """Call the brandfetch API"""
     logging.info(f"Calling Brandfetch API: {url}")
 
@@ -75,9 +125,19 @@ def call_brandfetch_api(url: str, brandfetch_api_key: str) -> dict:
         "accept": "application/json",
         "Authorization": f"Bearer {brandfetch_api_key}",
     }
-    response = requests.get(url, headers=headers, timeout=10)
-    if response.status_code == 200:
-        return response.json()
+    return await call_api(url, headers)
+
+
+async def call_api(url: str, headers: dict) -> dict:
+    """Get json from an API with the shared http session, None when the call fails"""
+    session = aio_helper.get_session()
+    try:
+        async with session.get(url, headers=headers, timeout=TIMEOUT) as response:
+            if response.status == 200:
+                return await response.json()
+            logging.warning(f"Error {response.status} calling {url}")
+    except (asyncio.TimeoutError, aiohttp.ClientError) as err:
+        logging.warning(f"Error calling {url}: {err!r}")
     return None
 
 
@@ -2,9 +2,10 @@
 import copy
 import logging
 import uuid
-from datetime import datetime, timedelta
 
-from shared_code import utils
+from shared_code import claim_check_helper, time_series_helper, utils
+
+MAX_FOREX_DAYS_BACK = 100
 
 
 def main(payload: str) -> str:
@@ -12,18 +13,17 @@ def main(payload: str) -> str:
     logging.info("Rebuilding transactions data")
 
     # get input data
-    transactions = payload[0]["transactions"]
+    transactions = claim_check_helper.check_out(payload[0]["transactions"])
     user_data = payload[0]["user_data"]
-    invested = payload[0]["invested"]
+    invested = claim_check_helper.check_out(payload[0]["invested"])
     daterange = payload[0]["daterange"]
-    forex_data = payload[1]
+    forex_data = claim_check_helper.check_out_values(payload[1])
 
     # add data to transactions
     transactions = add_data(transactions, forex_data, user_data)
     transactions = get_day_by_day_transactions(transactions, daterange)
 
     invested = add_data_invested(invested)
-    invested = get_day_by_day_invested(invested, daterange)
 
     # compute transactions
     realized = transactions["realized"]
@@ -36,91 +36,112 @@ def main(payload: str) -> str:
     stocks_held = {"realized": realized, "unrealized": unrealized}
 
     # compute invested
-    invested = calculate_deposits_and_withdrawals(invested, daterange)
-    invested = merge_deposits_and_withdrawals(invested, daterange)
+    invested = get_invested_by_day(invested, daterange)
 
-    return {"stock_held": stocks_held, "invested": invested}
+    return {
+        "stock_held": claim_check_helper.check_in(stocks_held),
+        "invested": claim_check_helper.check_in(invested),
+    }
 
 
 # start range rebuild_transactions
 def add_data(transactions, forex_data, user_data):
     """Add data to transactions"""
     output = []
-    days_to_subtract = 0
     for transaction in transactions:
-        while True:
-            date_string = f"{transaction['date']} 00:00:00"
-            date_object = datetime.fromisoformat(date_string)
-            date_object = date_object - timedelta(days=days_to_subtract)
-            date_object = date_object.strftime("%Y-%m-%d")
-            try:
-                forex_rate = float(
-                    forex_data[transaction["currency"]]["Time Series FX (Daily)"][
-                        date_object
-                    ]["4. close"]
-                )
-                if transaction["currency"] == user_data["currency"]:
-                    transaction.update(
-                        {
-                            "cost": transaction["cost_per_share"]
-                            * transaction["quantity"],
-                            "forex_rate": 1,
-                            "transaction_date": transaction["date"],
-                            "cost_per_share_foreign": transaction["cost_per_share"],
-                            "cost_foreign": transaction["cost_per_share"]
-                            * transaction["quantity"],
-                        }
-                    )
-                    break
-                transaction.update(
-                    {
-                        "cost": transaction["cost_per_share"]
-                        * transaction["quantity"]
-                        * forex_rate,
-                        "cost_per_share": transaction["cost_per_share"] * forex_rate,
-                        "cost_per_share_foreign": transaction["cost_per_share"],
-                        "cost_foreign": transaction["cost_per_share"]
-                        * transaction["quantity"],
-                        "forex_rate": forex_rate,
-                        "transaction_date": transaction["date"],
-                    }
-                )
-                break
-            except KeyError as error:
-                if days_to_subtract > 100:
-                    raise KeyError from error
-                days_to_subtract += 1
+        if transaction["currency"] == user_data["currency"]:
+            transaction.update(
+                {
+                    "cost": transaction["cost_per_share"] * transaction["quantity"],
+                    "forex_rate": 1,
+                    "transaction_date": transaction["date"],
+                    "cost_per_share_foreign": transaction["cost_per_share"],
+                    "cost_foreign": transaction["cost_per_share"]
+                    * transaction["quantity"],
+                }
+            )
+        else:
+            forex_rate = get_forex_rate(
+                forex_data, transaction["currency"], transaction["date"]
+            )
+            transaction.update(
+                {
+                    "cost": transaction["cost_per_share"]
+                    * transaction["quantity"]
+                    * forex_rate,
+                    "cost_per_share": transaction["cost_per_share"] * forex_rate,
+                    "cost_per_share_foreign": transaction["cost_per_share"],
+                    "cost_foreign": transaction["cost_per_share"]
+                    * transaction["quantity"],
+                    "forex_rate": forex_rate,
+                    "transaction_date": transaction["date"],
+                }
+            )
         transaction.pop("date")
         transaction.pop("id")
         output.append(transaction)
     return output
 
 
+def get_forex_rate(forex_data: dict, currency: str, single_date: str) -> float:
+    """Get the most recent forex close rate on or before a date"""
+    index = time_series_helper.get_as_of_index(
+        forex_data[currency]["dates"], single_date, MAX_FOREX_DAYS_BACK
+    )
+    if index is None:
+        raise KeyError(f"No forex data for {currency} on or before {single_date}")
+    return forex_data[currency]["columns"]["close"][index]
+
+
 def get_day_by_day_transactions(transactions: list, daterange):
     """Get day by day transactions"""
     realized = []
     unrealized = []
+    transactions = sorted(transactions, key=lambda k: k["transaction_date"])
+    ledgers = {}
+    index = 0
+
     for single_date in daterange:
-        temp_transactions = copy.deepcopy(transactions)
-        transactions_single_date = [
-            d for d in temp_transactions if d["transaction_date"] <= single_date
-        ]
-        transactions_single_date = add_date(transactions_single_date, single_date)
-        # get unique symbols
-        symbols = utils.get_unique_items(transactions_single_date, "symbol")
-        for symbol in symbols:
-            transactions_single_date_and_symbol = [
-                d for d in transactions_single_date if d["symbol"] == symbol
-            ]
-            realized_and_unrealized = calculate_realized_and_unrealized(
-                transactions_single_date_and_symbol
+        # add transactions up to and including this date to the ledgers
+        while (
+            index < len(transactions)
+            and transactions[index]["transaction_date"] <= single_date
+        ):
+            add_to_ledger(ledgers, transactions[index])
+            index += 1
+
+        # carry the open and closed lots of every symbol forward
+        for ledger in ledgers.values():
+            if ledger["changed"]:
+                update_ledger_lots(ledger)
+            realized.extend({**lot, "date": single_date} for lot in ledger["realized"])
+            unrealized.extend(
+                {**lot, "date": single_date} for lot in ledger["unrealized"]
             )
-            realized.extend(realized_and_unrealized["realized"])
-            unrealized.extend(realized_and_unrealized["unrealized"])
 
     return {"realized": realized, "unrealized": unrealized}
 
 
+def add_to_ledger(ledgers: dict, transaction: dict):
+    """Add transaction to the ledger of its symbol"""
+    ledger = ledgers.setdefault(
+        transaction["symbol"],
+        {"transactions": [], "realized": [], "unrealized": [], "changed": False},
+    )
+    ledger["transactions"].append(transaction)
+    ledger["changed"] = True
+
+
+def update_ledger_lots(ledger: dict):
+    """Split the transactions of a ledger into realized and unrealized lots"""
+    realized_and_unrealized = calculate_realized_and_unrealized(
+        [dict(d) for d in ledger["transactions"]]
+    )
+    ledger["realized"] = realized_and_unrealized["realized"]
+    ledger["unrealized"] = realized_and_unrealized["unrealized"]
+    ledger["changed"] = False
+
+
 def calculate_realized_and_unrealized(single_day_transactions):
     """Calculate realized and unrealized"""
     buys = [d for d in single_day_transactions if d["transaction_type"] == "Buy"]
@@ -176,15 +197,6 @@ def calculate_realized_and_unrealized(single_day_transactions):
             return {"unrealized": static_buys, "realized": realized}
 
 
-def add_date(items, single_date):
-    """Add date to transactions"""
-    output = []
-    for item in items:
-        item.update({"date": single_date})
-        output.append(item)
-    return output
-
-
 def add_data_invested(invested):
     """Add data to invested"""
     output = []
@@ -200,59 +212,31 @@ def add_data_invested(invested):
 
 
 # start range compute transactions
-def get_day_by_day_invested(invested: list, daterange):
-    """Get day by day invested"""
-    output = []
-    for single_date in daterange:
-        temp_invested = copy.deepcopy(invested)
-        invested_single_date = [
-            d for d in temp_invested if d["transaction_date"] <= single_date
-        ]
-        invested_single_date = add_date(invested_single_date, single_date)
-        output.extend(invested_single_date)
-    return output
-
-
 def calculate_sells_and_buys(stocks_held, daterange):
     """Merge sells and buys together"""
     logging.info("Calculating sells and buys")
 
     output = []
+    stocks_held_by_date = utils.group_items(stocks_held, "date")
 
     # loop through dates
     for single_date in daterange:
         logging.debug(f"Calculating sells and buys for {single_date}")
 
-        date_stocks_held_buys = [
-            d
-            for d in stocks_held
-            if d["date"] == single_date and d["transaction_type"] == "Buy"
-        ]
-        date_stocks_held_sells = [
-            d
-            for d in stocks_held
-            if d["date"] == single_date and d["transaction_type"] == "Sell"
-        ]
-
-        symbols_buys = utils.get_unique_items(date_stocks_held_buys, "symbol")
-        symbols_sells = utils.get_unique_items(date_stocks_held_sells, "symbol")
-
-        for symbol_buys in symbols_buys:
-            temp_object = create_buys_and_sells_object(
-                single_date, symbol_buys, date_stocks_held_buys, "Buy"
-            )
-            if not temp_object:
-                continue
-
-            output.append(temp_object)
+        date_stocks_held = utils.group_items(
+            stocks_held_by_date.get(single_date, []), "transaction_type"
+        )
 
-        for symbol_sells in symbols_sells:
-            temp_object = create_buys_and_sells_object(
-                single_date, symbol_sells, date_stocks_held_sells, "Sell"
+        for transaction_type in ("Buy", "Sell"):
+            symbols_stocks_held = utils.group_items(
+                date_stocks_held.get(transaction_type, []), "symbol"
             )
-            if not temp_object:
-                continue
-            output.append(temp_object)
+            for symbol, date_stock_held in symbols_stocks_held.items():
+                output.append(
+                    create_buys_and_sells_object(
+                        single_date, symbol, date_stock_held, transaction_type
+                    )
+                )
 
     return output
 
@@ -262,21 +246,16 @@ def merge_sells_and_buys(stocks_held, daterange, transaction_type):
     logging.info("Merging sells and buys")
 
     output = []
+    stocks_held_by_date = utils.group_items(stocks_held, "date")
     for single_date in daterange:
         logging.debug(f"Merging sells and buys for {single_date}")
 
-        # initialize variables
-        symbols = []
-
-        date_stocks_held = [d for d in stocks_held if d["date"] == single_date]
-
-        # get symbols
-        symbols = utils.get_unique_items(date_stocks_held, "symbol")
+        date_stocks_held = utils.group_items(
+            stocks_held_by_date.get(single_date, []), "symbol"
+        )
 
         # loop through symbols
-        for symbol in symbols:
-            single_stock_list = [d for d in date_stocks_held if d["symbol"] == symbol]
-
+        for symbol, single_stock_list in date_stocks_held.items():
             if (transaction_type == "unrealized") and (len(single_stock_list) == 1):
                 temp_object = single_stock_list[0]
                 temp_object.pop("transaction_type")
@@ -315,27 +294,24 @@ def merge_sells_and_buys(stocks_held, daterange, transaction_type):
 
 
 def create_buys_and_sells_object(
-    single_date, symbol, date_stocks_held, transaction_type
+    single_date, symbol, date_stock_held, transaction_type
 ):
-    """Create object for buys and sells"""
-    date_stock_held = [d for d in date_stocks_held if d["symbol"] == symbol]
-    if not date_stock_held:
-        return None
-
+    """Create object for buys and sells of a single symbol on a single date"""
     cost = [d["cost"] for d in date_stock_held]
     forex_rate = [d["forex_rate"] for d in date_stock_held]
+    total_cost = sum(cost)
+    total_cost_foreign = sum(d["cost_foreign"] for d in date_stock_held)
+    quantity = sum(d["quantity"] for d in date_stock_held)
 
     return {
         "date": single_date,
         "symbol": symbol,
-        "cost_per_share": sum(d["cost"] for d in date_stock_held)
-        / sum(d["quantity"] for d in date_stock_held),
-        "cost_per_share_foreign": sum(d["cost_foreign"] for d in date_stock_held)
-        / sum(d["quantity"] for d in date_stock_held),
-        "total_cost": sum(d["cost"] for d in date_stock_held),
-        "total_cost_foreign": sum(d["cost_foreign"] for d in date_stock_held),
+        "cost_per_share": total_cost / quantity,
+        "cost_per_share_foreign": total_cost_foreign / quantity,
+        "total_cost": total_cost,
+        "total_cost_foreign": total_cost_foreign,
         "average_fx_rate": utils.get_weighted_average(forex_rate, cost),
-        "quantity": sum(d["quantity"] for d in date_stock_held),
+        "quantity": quantity,
         "transaction_type": transaction_type,
         "transaction_cost": sum(d["transaction_cost"] for d in date_stock_held),
         "currency": date_stock_held[0]["currency"],
@@ -347,70 +323,36 @@ def create_buys_and_sells_object(
 # start range compute transactions
 
 
-def calculate_deposits_and_withdrawals(invested, daterange):
-    """Calculate deposits and withdrawals"""
-    logging.info("Calculating deposits and withdrawals")
-
-    output_list = []
-
-    for single_date in daterange:
-        # get deposits
-        invested_single_date = [d for d in invested if d["date"] == single_date]
-        deposits = [
-            d for d in invested_single_date if d["transaction_type"] == "Deposit"
-        ]
-        if deposits:
-            temp_object = {
-                "date": single_date,
-                "amount": sum(d["amount"] for d in deposits),
-                "transaction_type": "Deposit",
-            }
-            output_list.append(temp_object)
-
-        # get withdrawals
-        withdrawals = [
-            d for d in invested_single_date if d["transaction_type"] == "Withdrawal"
-        ]
-        if withdrawals:
-            temp_object = {
-                "date": single_date,
-                "amount": sum(d["amount"] for d in withdrawals),
-                "transaction_type": "Withdrawal",
-            }
-            output_list.append(temp_object)
-    # return dictionary
-    return output_list
-
-
-def merge_deposits_and_withdrawals(invested, daterange):
-    """Merge deposits and withdrawals"""
-    logging.info("Merging deposits and withdrawals")
+def get_invested_by_day(invested: list, daterange) -> list:
+    """Get day by day invested as a running total of deposits and withdrawals"""
+    logging.info("Calculating invested by day")
 
     output_list = []
+    invested = sorted(invested, key=lambda k: k["transaction_date"])
+    totals = {}
+    index = 0
 
     for single_date in daterange:
-        # get deposits
-        invested_single_date = [d for d in invested if d["date"] == single_date]
-        if (
-            len(invested_single_date) == 1
-            and invested_single_date[0]["transaction_type"] == "Deposit"
+        # add deposits and withdrawals up to and including this date
+        while (
+            index < len(invested) and invested[index]["transaction_date"] <= single_date
         ):
-            temp_object = {
-                "id": str(uuid.uuid4()),
-                "date": single_date,
-                "invested": invested_single_date[0]["amount"],
-            }
-            output_list.append(temp_object)
-        elif len(invested_single_date) == 2:
-            invested_single_date = sorted(
-                invested_single_date, key=lambda k: k["transaction_type"]
+            transaction_type = invested[index]["transaction_type"]
+            totals[transaction_type] = (
+                totals.get(transaction_type, 0) + invested[index]["amount"]
             )
-            temp_object = {
-                "id": str(uuid.uuid4()),
-                "date": single_date,
-                "invested": invested_single_date[0]["amount"]
-                - invested_single_date[1]["amount"],
-            }
-            output_list.append(temp_object)
+            index += 1
+
+        if "Deposit" not in totals:
+            continue
+
+        temp_object = {
+            "id": str(uuid.uuid4()),
+            "date": single_date,
+            "invested": totals["Deposit"] - totals["Withdrawal"]
+            if "Withdrawal" in totals
+            else totals["Deposit"],
+        }
+        output_list.append(temp_object)
     # return dictionary
     return output_list
@@ -11,6 +11,14 @@ import seaborn as sns
 
 from shared_code import cosmosdb_module, date_time_helper, utils, validate_input
 
+FIELDS = {
+    "dividend": ["date", "symbol", "realized.dividend"],
+    "transaction_cost": ["date", "symbol", "transaction_cost"],
+}
+
+# create the cosmosdb handles on a cold start, before the first request
+cosmosdb_module.warm_up(["stocks_held", "input_transactions"])
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """ "HTTP trigger function to get line chart data"""
@@ -84,11 +92,12 @@ def get_data(
     datatype: str, all_data: bool, start_date: str, end_date: str, userid: str
 ):
     """Get data from database"""
+    select = cosmosdb_module.get_select(FIELDS[datatype])
     if all_data:
-        query = "SELECT * FROM c WHERE c.userid = @userid"
+        query = f"{select} FROM c WHERE c.userid = @userid"
         parameters = [{"name": "@userid", "value": userid}]
     else:
-        query = "SELECT * FROM c WHERE c.userid = @userid AND c.date >= @start_date AND c.date <= @end_date"
+        query = f"{select} FROM c WHERE c.userid = @userid AND c.date >= @start_date AND c.date <= @end_date"
         parameters = [
             {"name": "@userid", "value": userid},
             {"name": "@start_date", "value": start_date},
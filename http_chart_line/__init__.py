@@ -9,6 +9,11 @@ import pandas as pd
 
 from shared_code import cosmosdb_module, utils, validate_input
 
+FIELDS = ["date", "total_invested", "unrealized.total_value", "unrealized.total_pl"]
+
+# create the cosmosdb handles on a cold start, before the first request
+cosmosdb_module.warm_up(["totals"])
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """ "HTTP trigger function to get line chart data"""
@@ -49,7 +54,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     if all_data:
         items = list(
             container.query_items(
-                query="select * from c where c.userid = @userid",
+                query=f"{cosmosdb_module.get_select(FIELDS)} FROM c WHERE c.userid = @userid",
                 parameters=[{"name": "@userid", "value": userid}],
                 enable_cross_partition_query=True,
             )
@@ -66,7 +71,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     else:
         items = list(
             container.query_items(
-                query="SELECT * FROM c WHERE c.userid = @userid AND c.date >= @start_date AND c.date <= @end_date",
+                query=f"{cosmosdb_module.get_select(FIELDS)} FROM c WHERE c.userid = @userid AND c.date >= @start_date AND c.date <= @end_date",
                 parameters=[
                     {"name": "@userid", "value": userid},
                     {"name": "@start_date", "value": start_date},
@@ -10,6 +10,12 @@ import seaborn as sns
 
 from shared_code import cosmosdb_module, utils
 
+FIELDS = ["date", "symbol", "currency", "unrealized.total_value"]
+META_DATA_FIELDS = ["symbol", "country", "sector"]
+
+# create the cosmosdb handles on a cold start, before the first request
+cosmosdb_module.warm_up(["stocks_held", "meta_data"])
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Main function"""
@@ -34,7 +40,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     container = cosmosdb_module.cosmosdb_container("stocks_held")
     results = list(
         container.query_items(
-            query="select * from c where c.fully_realized = false and c.userid = @userid and c.date >= @start_date and c.date <= @end_date",
+            query=f"{cosmosdb_module.get_select(FIELDS)} FROM c WHERE c.fully_realized = false and c.userid = @userid and c.date >= @start_date and c.date <= @end_date",
             parameters=[
                 {"name": "@userid", "value": userid},
                 {"name": "@start_date", "value": start_date},
@@ -49,7 +55,9 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         most_recent_date = results[0]["date"]
         results = [item for item in results if item["date"] == most_recent_date]
 
-    results = utils.add_meta_data_to_stock_data(results, "meta_data", userid)
+    results = utils.add_meta_data_to_stock_data(
+        results, "meta_data", userid, META_DATA_FIELDS
+    )
 
     result_list = []
     for result in results:
@@ -8,6 +8,24 @@ import azure.functions as func
 
 from shared_code import cosmosdb_module, utils
 
+STOCKS_HELD_FIELDS = [
+    "id",
+    "date",
+    "symbol",
+    "currency",
+    "fully_realized",
+    "partial_realized",
+    "realized",
+    "unrealized",
+    "combined",
+    "weight",
+]
+
+# create the cosmosdb handles on a cold start, before the first request
+cosmosdb_module.warm_up(
+    ["input_invested", "input_transactions", "stocks_held", "meta_data"]
+)
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Main function"""
@@ -126,19 +144,20 @@ def get_items(containername, andor, fully_realized, partial_realized, userid, sy
 
 def construct_query(andor, fully_realized, partial_realized, symbol):
     """Construct query"""
+    select = cosmosdb_module.get_select(STOCKS_HELD_FIELDS)
     query = None
 
     if fully_realized is not None:
-        query = "select * from c where c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
+        query = f"{select} FROM c WHERE c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
     if partial_realized is not None:
-        query = "select * from c where c.partial_realized = @partial_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
+        query = f"{select} FROM c WHERE c.partial_realized = @partial_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
     if fully_realized is not None and partial_realized is not None:
         if andor == "or":
-            query = "select * from c where (c.partial_realized = @partial_realized or c.fully_realized = @fully_realized) and c.userid = @userid and c.date > @start_date and c.date < @end_date"
+            query = f"{select} FROM c WHERE (c.partial_realized = @partial_realized or c.fully_realized = @fully_realized) and c.userid = @userid and c.date > @start_date and c.date < @end_date"
         if andor == "and":
-            query = "select * from c where c.partial_realized = @partial_realized and c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
+            query = f"{select} FROM c WHERE c.partial_realized = @partial_realized and c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date"
     if query is None:
-        query = "select * from c where c.userid = @userid and c.date > @start_date and c.date < @end_date"
+        query = f"{select} FROM c WHERE c.userid = @userid and c.date > @start_date and c.date < @end_date"
     if symbol is not None:
         query = f"{query} and c.symbol = @symbol"
 
@@ -9,6 +9,25 @@ import azure.functions as func
 
 from shared_code import cosmosdb_module, utils, validate_input
 
+FIELDS = {
+    "stocks_held": [
+        "id",
+        "date",
+        "symbol",
+        "currency",
+        "fully_realized",
+        "partial_realized",
+        "realized",
+        "unrealized",
+        "combined",
+        "weight",
+    ],
+    "totals": ["id", "date", "total_invested", "realized", "unrealized", "combined"],
+}
+
+# create the cosmosdb handles on a cold start, before the first request
+cosmosdb_module.warm_up(["stocks_held", "totals", "meta_data"])
+
 
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Main function"""
@@ -320,10 +339,11 @@ def create_result_totals(start_data: dict, end_data: dict):
 
 def query_builder(container_name: str):
     """Build query"""
+    select = cosmosdb_module.get_select(FIELDS[container_name])
     if container_name == "stocks_held":
-        return "SELECT * FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.fully_realized = false and c.userid = @userid"
+        return f"{select} FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.fully_realized = false and c.userid = @userid"
     if container_name == "totals":
-        return "SELECT * FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.userid = @userid"
+        return f"{select} FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.userid = @userid"
 
 
 def run_query(container_name: str, start_date: str, end_date: str, userid: str):
@@ -4,7 +4,7 @@
 import logging
 from functools import partial
 
-from shared_code import aio_helper, cosmosdb_module
+from shared_code import claim_check_helper, cosmosdb_module
 
 
 async def main(payload: str) -> str:
@@ -16,21 +16,16 @@ async def main(payload: str) -> str:
 
     # get config
     container_name = payload[0]
-    items = payload[1]
+    items = claim_check_helper.check_out(payload[1])
+    upsert = payload[2] if len(payload) > 2 else False
 
     logging.info(f"Outputting to container {container_name}")
 
-    tasks = []
-    container = cosmosdb_module.cosmosdb_container(container_name)
+    container = cosmosdb_module.cosmosdb_async_container(container_name)
+    container_function = partial(
+        container.upsert_item if upsert else container.create_item,
+        initial_headers=cosmosdb_module.MINIMAL_RESPONSE,
+    )
 
-    for item in items:
-        # fill event loop list
-        tasks.append(
-            cosmosdb_module.container_function_with_back_off(
-                partial(container.create_item, item)
-            )
-        )
-
-    await aio_helper.gather_with_concurrency(50, *tasks)
-
-    return '{"status": "Done"}'
+    report = await cosmosdb_module.write_concurrently(container_function, items)
+    return cosmosdb_module.get_write_result(container_name, report)
@@ -11,25 +11,12 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
 
     result = {"status": "No data to process"}
 
-    # Delete old data
-    items_to_delete = yield context.call_activity(
-        "get_cosmosdb_items", [days_to_update, userid, ["stocks_held", "totals"]]
-    )
-
-    for container_name, items in items_to_delete.items():
-        items = [items[i : i + 5000] for i in range(0, len(items), 5000)]
-        for batch in items:
-            result = yield context.call_activity(
-                "delete_cosmosdb_items", [container_name, batch]
-            )
-
-    # Output new data
-    for container_name, items in data.items():
-        items = [items[i : i + 5000] for i in range(0, len(items), 5000)]
-        for batch in items:
-            result = yield context.call_activity(
-                "output_to_cosmosdb", [container_name, batch]
-            )
+    # Only write the rows whose content changed and delete the rows that are gone,
+    # the output is already split in batches that may be claim check references
+    for container_name, batches in data.items():
+        result = yield context.call_activity(
+            "sync_cosmosdb_items", [container_name, batches, days_to_update, userid]
+        )
 
     return result
 
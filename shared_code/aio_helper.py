@@ -2,6 +2,13 @@
 
 import asyncio
 
+import aiohttp
+
+# one keep-alive session per event loop, shared by all invocations in the process
+sessions: dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+# tasks closing the session of their loop when it shuts down
+closers: dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+
 
 async def gather_with_concurrency(concurrency: int, *tasks):
     """Async gather with max concurrency"""
@@ -12,3 +19,41 @@ async def gather_with_concurrency(concurrency: int, *tasks):
             return await task
 
     return await asyncio.gather(*(sem_task(task) for task in tasks))
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Get the shared http session of the running event loop"""
+    # sessions of closed loops were already closed by their closer task
+    for closed_loop in [loop for loop in sessions if loop.is_closed()]:
+        del sessions[closed_loop]
+        del closers[closed_loop]
+
+    loop = asyncio.get_running_loop()
+    session = sessions.get(loop)
+    if session is None or session.closed:
+        if loop in closers:
+            closers[loop].cancel()
+        session = aiohttp.ClientSession()
+        sessions[loop] = session
+        closers[loop] = loop.create_task(close_on_shutdown(session))
+    return session
+
+
+async def close_on_shutdown(resource) -> None:
+    """Close a session or client when its event loop cancels the remaining tasks on shutdown"""
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await resource.close()
+
+
+async def close_session() -> None:
+    """Close the shared http session of the running event loop"""
+    loop = asyncio.get_running_loop()
+    session = sessions.pop(loop, None)
+    closer = closers.pop(loop, None)
+    if closer is not None:
+        closer.cancel()
+        await asyncio.gather(closer, return_exceptions=True)
+    if session is not None:
+        await session.close()
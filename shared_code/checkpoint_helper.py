@@ -0,0 +1,24 @@
+"""Checkpoint helper functions"""
+import hashlib
+import json
+from datetime import date, timedelta
+
+from shared_code import date_time_helper
+
+
+def get_checkpoint_date(days_to_update: int | str) -> str:
+    """Get the date of a new checkpoint, the last date before the update window"""
+    # later updates with the same window start after it, a full update uses
+    # yesterday as prices of today can still change
+    start_date = date_time_helper.get_start_date(days_to_update)
+    if start_date is None:
+        start_date = date.today()
+    return (start_date - timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+def get_fingerprint(transactions: list, currency: str, checkpoint_date: str) -> str:
+    """Get a fingerprint of the input the state of a checkpoint depends on"""
+    transactions = [d for d in transactions if d["date"] <= checkpoint_date]
+    return hashlib.sha256(
+        json.dumps([currency, transactions], sort_keys=True).encode("utf-8")
+    ).hexdigest()
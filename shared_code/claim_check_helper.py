@@ -0,0 +1,72 @@
+"""Claim check helper functions, large payloads are stored and passed by reference"""
+import json
+import os
+import shutil
+import uuid
+from datetime import date, timedelta
+
+from shared_code import get_config
+
+REFERENCE_KEY = "claim_check"
+MIN_SIZE = 32 * 1024
+RETENTION_DAYS = 7
+
+
+def is_reference(value) -> bool:
+    """Check if a value is a claim check reference"""
+    return isinstance(value, dict) and list(value) == [REFERENCE_KEY]
+
+
+def check_in(value):
+    """Store a large value and get a reference to it, small values are returned as is"""
+    store = get_config.get_claim_check_dir()
+    if store is None:
+        return value
+
+    data = json.dumps(value)
+    if len(data) < MIN_SIZE:
+        return value
+
+    folder = str(date.today())
+    if not os.path.isdir(os.path.join(store, folder)):
+        os.makedirs(os.path.join(store, folder), exist_ok=True)
+        delete_expired(store)
+
+    name = f"{folder}/{uuid.uuid4()}.json"
+    path = os.path.join(store, name)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as file:
+        file.write(data)
+    os.replace(f"{path}.tmp", path)
+    return {REFERENCE_KEY: name}
+
+
+def check_out(value):
+    """Get the value of a claim check reference, other values are returned as is"""
+    if not is_reference(value):
+        return value
+
+    store = get_config.get_claim_check_dir()
+    if store is None:
+        raise Exception("Claim check store is not configured")
+    with open(os.path.join(store, value[REFERENCE_KEY]), "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def check_out_values(data: dict) -> dict:
+    """Get the values of a dictionary of claim check references"""
+    return {key: check_out(value) for key, value in data.items()}
+
+
+def check_in_batches(items: list, batch_size: int) -> list:
+    """Split a list in batches and check in every batch"""
+    return [
+        check_in(items[i : i + batch_size]) for i in range(0, len(items), batch_size)
+    ]
+
+
+def delete_expired(store: str) -> None:
+    """Delete the folders of claim checks older than the retention period"""
+    cutoff = str(date.today() - timedelta(days=RETENTION_DAYS))
+    for folder in os.listdir(store):
+        if folder < cutoff and os.path.isdir(os.path.join(store, folder)):
+            shutil.rmtree(os.path.join(store, folder), ignore_errors=True)
@@ -0,0 +1,60 @@
+"""Shared company data store helper functions"""
+import logging
+from datetime import date, timedelta
+
+from azure.cosmos import exceptions
+
+from shared_code import cosmosdb_module
+
+CONTAINER_NAME = "company_data"
+TTL_DAYS = 30
+FIELDS = (
+    "name",
+    "description",
+    "country",
+    "sector",
+    "domain",
+    "links",
+    "logo",
+    "icon",
+    "symbol_img",
+    "banner",
+)
+
+
+def read_company_data(domain: str) -> dict | None:
+    """Read the shared company data of a domain"""
+    container = cosmosdb_module.cosmosdb_container(CONTAINER_NAME)
+    try:
+        return container.read_item(item=domain, partition_key=domain)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    except exceptions.CosmosHttpResponseError as err:
+        logging.warning(f"Could not read company data {domain}: {err}")
+        return None
+
+
+def write_company_data(domain: str, data: dict) -> dict:
+    """Write the company data of a domain to the shared store"""
+    item = {"id": domain, "expiry": get_expiry(), **get_fields(data)}
+    container = cosmosdb_module.cosmosdb_container(CONTAINER_NAME)
+    try:
+        container.upsert_item(item)
+    except exceptions.CosmosHttpResponseError as err:
+        logging.warning(f"Could not write company data {domain}: {err}")
+    return item
+
+
+def get_expiry(days: int = TTL_DAYS) -> str:
+    """Get the expiry date of company data fetched today"""
+    return (date.today() + timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def is_fresh(item: dict) -> bool:
+    """Check if the shared company data has not expired"""
+    return item["expiry"] >= str(date.today())
+
+
+def get_fields(item: dict) -> dict:
+    """Get the company fields of a shared company data item"""
+    return {key: item.get(key, None) for key in FIELDS}
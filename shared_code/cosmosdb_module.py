@@ -2,21 +2,48 @@
 
 
 import asyncio
+import json
 import logging
 import random
+from datetime import date, timedelta
+from functools import partial
 from typing import Callable
 
-from azure.cosmos import cosmos_client, exceptions
+from azure.cosmos import ContainerProxy, cosmos_client, exceptions
+from azure.cosmos import aio as cosmos_aio
 
-from shared_code import get_config
+from shared_code import aio_helper, get_config
+
+MAX_CONCURRENT_WRITES = 50
+
+# throttled, retry with, and service unavailable responses are worth retrying
+RETRY_STATUS_CODES = (429, 449, 503)
+
+# skip returning the written document in the response
+MINIMAL_RESPONSE = {"Prefer": "return=minimal"}
+
+# one client per account and a handle per container, shared by all invocations in the process
+clients: dict[tuple[str, str], cosmos_client.CosmosClient] = {}
+containers: dict[tuple[str, str, str], ContainerProxy] = {}
+
+# async clients are bound to the event loop they were created on
+async_clients: dict[
+    tuple[asyncio.AbstractEventLoop, str, str], cosmos_aio.CosmosClient
+] = {}
+# tasks closing the async clients of their loop when it shuts down
+async_closers: dict[tuple[asyncio.AbstractEventLoop, str, str], asyncio.Task] = {}
 
 
 def cosmosdb_client() -> cosmos_client.CosmosClient:
-    """CosmosDB client"""
+    """CosmosDB client, created once per process"""
     cosmosdb_config = get_config.get_cosmosdb()
-    client = cosmos_client.CosmosClient(
-        cosmosdb_config["endpoint"], cosmosdb_config["key"]
-    )
+    key = (cosmosdb_config["endpoint"], cosmosdb_config["key"])
+    client = clients.get(key)
+    if client is None:
+        client = cosmos_client.CosmosClient(
+            cosmosdb_config["endpoint"], cosmosdb_config["key"]
+        )
+        clients[key] = client
     return client
 
 
@@ -28,13 +55,120 @@ def cosmosdb_database():
     return database
 
 
-def cosmosdb_container(container_name: str):
-    """CosmosDB container"""
-    database = cosmosdb_database()
-    container = database.get_container_client(container_name)
+def cosmosdb_container(container_name: str) -> ContainerProxy:
+    """CosmosDB container, resolved once per process"""
+    cosmosdb_config = get_config.get_cosmosdb()
+    key = (cosmosdb_config["endpoint"], cosmosdb_config["database"], container_name)
+    container = containers.get(key)
+    if container is None:
+        database = cosmosdb_database()
+        container = database.get_container_client(container_name)
+        containers[key] = container
     return container
 
 
+def cosmosdb_async_client() -> cosmos_aio.CosmosClient:
+    """Async CosmosDB client, created once per event loop"""
+    # clients of closed loops were already closed by their closer task
+    for key in [key for key in async_clients if key[0].is_closed()]:
+        del async_clients[key]
+        del async_closers[key]
+
+    cosmosdb_config = get_config.get_cosmosdb()
+    key = (
+        asyncio.get_running_loop(),
+        cosmosdb_config["endpoint"],
+        cosmosdb_config["key"],
+    )
+    client = async_clients.get(key)
+    if client is None:
+        client = cosmos_aio.CosmosClient(
+            cosmosdb_config["endpoint"], cosmosdb_config["key"]
+        )
+        async_clients[key] = client
+        async_closers[key] = key[0].create_task(aio_helper.close_on_shutdown(client))
+    return client
+
+
+async def close_async_clients() -> None:
+    """Close the async CosmosDB clients of the running event loop"""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in async_clients if key[0] is loop]:
+        client = async_clients.pop(key)
+        closer = async_closers.pop(key)
+        closer.cancel()
+        await asyncio.gather(closer, return_exceptions=True)
+        await client.close()
+
+
+def cosmosdb_async_container(container_name: str) -> cosmos_aio.ContainerProxy:
+    """Async CosmosDB container of the running event loop"""
+    cosmosdb_config = get_config.get_cosmosdb()
+    database = cosmosdb_async_client().get_database_client(cosmosdb_config["database"])
+    return database.get_container_client(container_name)
+
+
+def get_select(fields: list[str] | None = None) -> str:
+    """Get the select clause of the fields a query needs, dotted fields such as unrealized.total_value keep their nesting"""
+    if not fields:
+        return "SELECT *"
+
+    # the projected fields come from code, never from a request
+    tree = {}
+    for field in fields:
+        *parents, name = field.split(".")
+        node = tree
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        node[name] = {}
+
+    def get_value(path: str, children: dict) -> str:
+        if not children:
+            return path
+        properties = ", ".join(
+            f'"{key}": {get_value(f"{path}.{key}", value)}'
+            for key, value in children.items()
+        )
+        return f"{{{properties}}}"
+
+    return "SELECT " + ", ".join(
+        f"{get_value(f'c.{key}', value)} AS {key}" if value else f"c.{key}"
+        for key, value in tree.items()
+    )
+
+
+def get_user_items_query(
+    days_to_update: int | str, userid: str, fields: list[str] | None = None
+) -> tuple[str, list]:
+    """Get the query of the items of a user in the update window"""
+    select = get_select(fields)
+    if days_to_update == "all":
+        query = f"{select} FROM c WHERE c.userid = @userid"
+        parameters = [{"name": "@userid", "value": userid}]
+    else:
+        today = date.today()
+        end_date = today.strftime("%Y-%m-%d")
+        start_date = (today - timedelta(days=days_to_update)).strftime("%Y-%m-%d")
+
+        query = f"{select} FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.userid = @userid"
+        parameters = [
+            {"name": "@start_date", "value": start_date},
+            {"name": "@end_date", "value": end_date},
+            {"name": "@userid", "value": userid},
+        ]
+    return query, parameters
+
+
+def warm_up(container_names: list[str]) -> None:
+    """Create the client and container handles ahead of the first request"""
+    try:
+        for container_name in container_names:
+            cosmosdb_container(container_name)
+    except Exception as err:
+        # the first request creates the handles instead
+        logging.warning(f"Could not warm up cosmosdb containers: {err}")
+
+
 async def container_function_with_back_off(
     function: Callable,
     max_retries: int = 10,
@@ -50,11 +184,13 @@ async def container_function_with_back_off(
         except exceptions.CosmosResourceExistsError:
             logging.debug("Item already exists")
             break
-        except exceptions.CosmosHttpResponseError as err:
-            if err.status_code == 404:
-                logging.debug("Item not found")
-                break
         except Exception as err:
+            if isinstance(err, exceptions.CosmosHttpResponseError):
+                if err.status_code == 404:
+                    logging.debug("Item not found")
+                    break
+                if err.status_code not in RETRY_STATUS_CODES:
+                    raise err
             if retry_count >= max_retries:
                 logging.error("Max retries reached")
                 raise err
@@ -65,3 +201,49 @@ async def container_function_with_back_off(
                 random.uniform(0, 1) * min(retry_count, 1)
             )
             retry_count += 1
+
+
+async def write_concurrently(
+    container_function: Callable,
+    items: list,
+    concurrency: int = MAX_CONCURRENT_WRITES,
+) -> dict:
+    """Write every item with its own request concurrently, summing the request charge and collecting failures"""
+    report = {"items": len(items), "request_charge": 0.0, "failed": []}
+
+    def response_hook(headers, _):
+        report["request_charge"] += float(headers.get("x-ms-request-charge", 0))
+
+    async def write(item):
+        try:
+            await container_function_with_back_off(
+                partial(container_function, item, response_hook=response_hook)
+            )
+        except Exception as err:
+            logging.error(f"Could not write item {item.get('id')}: {err}")
+            report["failed"].append(item.get("id"))
+
+    await aio_helper.gather_with_concurrency(
+        concurrency, *(write(item) for item in items)
+    )
+    return report
+
+
+def get_write_result(container_name: str, report: dict) -> str:
+    """Log the report of a concurrent write as the activity result, failing on any unwritten item"""
+    logging.info(
+        f"Wrote {report['items']} items to {container_name} "
+        f"for {report['request_charge']:.0f} RU"
+    )
+    if report["failed"]:
+        raise Exception(
+            f"Failed to write {len(report['failed'])} of {report['items']} items"
+            f" to {container_name}"
+        )
+    return json.dumps(
+        {
+            "status": "Done",
+            "items": report["items"],
+            "request_charge": report["request_charge"],
+        }
+    )
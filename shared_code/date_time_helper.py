@@ -1,5 +1,5 @@
 """Date and time Helper functions"""
-from datetime import date
+from datetime import date, timedelta
 from typing import Literal
 
 import pandas as pd
@@ -96,3 +96,10 @@ def get_weeks(start_date: str | date, end_date: str | date) -> list:
         freq="W",
     ).tolist()
     return weeks
+
+
+def get_start_date(days_to_update: int | str) -> date | None:
+    """Get the first date to update, None when all dates are updated"""
+    if days_to_update == "all":
+        return None
+    return date.today() - timedelta(days=days_to_update)
@@ -0,0 +1,118 @@
+"""Foreign exchange helper functions"""
+from datetime import date, timedelta
+
+import numpy as np
+
+PIVOT_CURRENCY = "USD"
+
+# currencies quoted in a fraction of another currency, e.g. pence sterling
+SUB_UNITS = {"GBX": ("GBP", 100), "ZAC": ("ZAR", 100), "ILA": ("ILS", 100)}
+
+# cross rates of every currency pair, with the source dates they were derived from
+cross_rates: dict[tuple[str, str], tuple[tuple, dict]] = {}
+
+
+def get_base_currency(currency: str) -> tuple[str, int]:
+    """Get the currency a sub unit is quoted in and its divisor, GBX becomes GBP and 100"""
+    return SUB_UNITS.get(currency, (currency, 1))
+
+
+def get_pivot_url(currency: str) -> str | None:
+    """Get the url of the daily rates of a currency against the pivot currency"""
+    base_currency = get_base_currency(currency)[0]
+    if base_currency == PIVOT_CURRENCY:
+        return None
+    return f"https://www.alphavantage.co/query?function=FX_DAILY&from_symbol={base_currency}&to_symbol={PIVOT_CURRENCY}&outputsize=full"
+
+
+def get_pivot_urls(from_currency: str, to_currency: str) -> list[str]:
+    """Get the urls needed to derive the rates of a currency pair"""
+    if get_base_currency(from_currency)[0] == get_base_currency(to_currency)[0]:
+        return []
+    return [
+        url
+        for url in (get_pivot_url(from_currency), get_pivot_url(to_currency))
+        if url is not None
+    ]
+
+
+def get_cross_rate(
+    from_currency: str, to_currency: str, pivot_data: dict, oldest_date: str
+) -> dict:
+    """Get the columnar close rates of a currency pair from the rates against the pivot currency"""
+    from_data = pivot_data.get(get_pivot_url(from_currency))
+    to_data = pivot_data.get(get_pivot_url(to_currency))
+    if from_data is None and to_data is None:
+        source = (oldest_date, str(date.today()))
+    else:
+        source = tuple(
+            (data["dates"][-1], len(data["dates"])) if data else None
+            for data in (from_data, to_data)
+        )
+
+    cached = cross_rates.get((from_currency, to_currency))
+    if cached is not None and cached[0] == source:
+        return cached[1]
+
+    if get_base_currency(from_currency)[0] == get_base_currency(to_currency)[0]:
+        data = get_constant_rate(from_currency, to_currency, oldest_date)
+    else:
+        data = divide_rates(from_currency, to_currency, from_data, to_data)
+    cross_rates[(from_currency, to_currency)] = (source, data)
+    return data
+
+
+def divide_rates(
+    from_currency: str, to_currency: str, from_data: dict | None, to_data: dict | None
+) -> dict:
+    """Divide the pivot rates of two currencies on aligned dates, rates of the pivot currency itself are 1"""
+    if from_data is None:
+        dates = np.array(to_data["dates"])
+        from_close = np.ones(len(dates))
+    else:
+        dates = np.array(from_data["dates"])
+        from_close = np.array(from_data["columns"]["close"])
+
+    if to_data is None:
+        to_close = np.ones(len(dates))
+    else:
+        # use the most recent rate on or before every date
+        positions = np.searchsorted(np.array(to_data["dates"]), dates, side="right") - 1
+        if from_data is not None:
+            dates, from_close = dates[positions >= 0], from_close[positions >= 0]
+            positions = positions[positions >= 0]
+        to_close = np.array(to_data["columns"]["close"])[positions]
+
+    from_divisor = get_base_currency(from_currency)[1]
+    to_divisor = get_base_currency(to_currency)[1]
+    close = from_close / to_close / from_divisor * to_divisor
+    return {
+        "meta_data": get_meta_data(from_currency, to_currency, dates.tolist()),
+        "dates": dates.tolist(),
+        "columns": {"close": close.tolist()},
+    }
+
+
+def get_constant_rate(from_currency: str, to_currency: str, oldest_date: str) -> dict:
+    """Get the fixed daily rates between units of the same currency, e.g. GBX to GBP"""
+    first_date = date.fromisoformat(oldest_date)
+    dates = [
+        str(first_date + timedelta(days=days))
+        for days in range((date.today() - first_date).days + 1)
+    ]
+    rate = get_base_currency(to_currency)[1] / get_base_currency(from_currency)[1]
+    return {
+        "meta_data": get_meta_data(from_currency, to_currency, dates),
+        "dates": dates,
+        "columns": {"close": [float(rate)] * len(dates)},
+    }
+
+
+def get_meta_data(from_currency: str, to_currency: str, dates: list) -> dict:
+    """Get the meta data of a cross rate"""
+    return {
+        "1. Information": f"FX Daily Prices via {PIVOT_CURRENCY}",
+        "2. From Symbol": from_currency,
+        "3. To Symbol": to_currency,
+        "5. Last Refreshed": dates[-1] if dates else None,
+    }
@@ -2,18 +2,42 @@
 
 # Imports
 import os
+from functools import cache
 
 from dotenv import load_dotenv
 
 
 # functions
+@cache
+def load_env() -> None:
+    """Load the .env file once per process"""
+
+    load_dotenv()
+
+
 def get_cosmosdb() -> dict[str, str]:
     """Get cosmosdb"""
 
-    load_dotenv()
+    load_env()
 
     return {
         "endpoint": os.environ["COSMOSDB_ENDPOINT"],
         "key": os.environ["COSMOSDB_KEY"],
         "database": os.environ["COSMOSDB_DATABASE"],
     }
+
+
+def get_time_series_cache_dir() -> str | None:
+    """Get the time series cache directory, None when caching is disabled"""
+
+    load_env()
+
+    return os.environ.get("TIME_SERIES_CACHE_DIR")
+
+
+def get_claim_check_dir() -> str | None:
+    """Get the claim check store directory, None when payloads are passed inline"""
+
+    load_env()
+
+    return os.environ.get("CLAIM_CHECK_DIR")
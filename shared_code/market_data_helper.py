@@ -0,0 +1,48 @@
+"""Shared market data store helper functions"""
+import logging
+from datetime import date
+
+from azure.cosmos import exceptions
+
+from shared_code import cosmosdb_module
+
+CONTAINER_NAME = "market_data"
+
+
+def read_market_data(market_data_id: str) -> dict | None:
+    """Read the shared market data of a symbol or currency pair"""
+    container = cosmosdb_module.cosmosdb_container(CONTAINER_NAME)
+    try:
+        return container.read_item(item=market_data_id, partition_key=market_data_id)
+    except exceptions.CosmosResourceNotFoundError:
+        return None
+    except exceptions.CosmosHttpResponseError as err:
+        logging.warning(f"Could not read market data {market_data_id}: {err}")
+        return None
+
+
+def write_market_data(market_data_id: str, data: dict) -> None:
+    """Write the columnar market data of a symbol or currency pair to the shared store"""
+    item = {
+        "id": market_data_id,
+        "updated": str(date.today()),
+        "last_date": data["dates"][-1],
+        "meta_data": data["meta_data"],
+        "dates": data["dates"],
+        "columns": data["columns"],
+    }
+    container = cosmosdb_module.cosmosdb_container(CONTAINER_NAME)
+    try:
+        container.upsert_item(item)
+    except exceptions.CosmosHttpResponseError as err:
+        logging.warning(f"Could not write market data {market_data_id}: {err}")
+
+
+def is_fresh(item: dict) -> bool:
+    """Check if the shared market data was updated today"""
+    return item["updated"] == str(date.today())
+
+
+def get_columns(item: dict) -> dict:
+    """Get the columnar time series of a shared market data item"""
+    return {key: item[key] for key in ("meta_data", "dates", "columns")}
@@ -0,0 +1,81 @@
+"""Rate limit helper functions for Alpha Vantage api keys"""
+import asyncio
+import logging
+import math
+import time
+from datetime import date
+
+PLANS = {
+    "free": {"calls_per_minute": 5, "calls_per_day": 25},
+    "premium_75": {"calls_per_minute": 75, "calls_per_day": None},
+    "premium_150": {"calls_per_minute": 150, "calls_per_day": None},
+    "premium_300": {"calls_per_minute": 300, "calls_per_day": None},
+    "premium_600": {"calls_per_minute": 600, "calls_per_day": None},
+    "premium_1200": {"calls_per_minute": 1200, "calls_per_day": None},
+    # users without a plan setting are paced like a free key, but only a free plan
+    # set by the user caps the calls of a day
+    "default": {"calls_per_minute": 5, "calls_per_day": None},
+}
+DEFAULT_PLAN = "default"
+
+# token bucket per api key, shared by all invocations in the process
+buckets: dict[str, dict] = {}
+
+
+def get_bucket(api_key: str, plan: str) -> dict:
+    """Get the token bucket of an api key, refilled up to now"""
+    now = time.monotonic()
+    today = date.today()
+    bucket = buckets.get(api_key)
+    if bucket is None or bucket["plan"] != plan:
+        # a bucket holds a single token so calls are spread evenly over the minute
+        bucket = {"plan": plan, "tokens": 1.0, "updated": now, "day": today}
+        bucket["calls_today"] = 0
+        buckets[api_key] = bucket
+
+    rate = PLANS[plan]["calls_per_minute"] / 60
+    bucket["tokens"] = min(1.0, bucket["tokens"] + (now - bucket["updated"]) * rate)
+    bucket["updated"] = now
+    if bucket["day"] != today:
+        bucket["day"] = today
+        bucket["calls_today"] = 0
+    return bucket
+
+
+def get_concurrency(plan: str) -> int:
+    """Get the calls that can be in flight at once for a plan, one per call a second"""
+    return math.ceil(PLANS[plan]["calls_per_minute"] / 60)
+
+
+def reserve(api_key: str, plan: str) -> float:
+    """Reserve a call, returning the seconds to wait before making it"""
+    bucket = get_bucket(api_key, plan)
+    calls_per_day = PLANS[plan]["calls_per_day"]
+    if calls_per_day is not None and bucket["calls_today"] >= calls_per_day:
+        raise Exception("Daily api call limit reached, Exiting.")
+
+    bucket["tokens"] -= 1
+    bucket["calls_today"] += 1
+    if bucket["tokens"] >= 0:
+        return 0.0
+    return -bucket["tokens"] * 60 / PLANS[plan]["calls_per_minute"]
+
+
+async def acquire(api_key: str, plan: str) -> None:
+    """Wait until a call can be made without hitting the rate limit"""
+    wait = reserve(api_key, plan)
+    if wait > 0:
+        logging.debug(f"Waiting {wait:.1f} seconds for the rate limit")
+        await asyncio.sleep(wait)
+
+
+def get_remaining(api_key: str, plan: str) -> dict:
+    """Get the calls that can be made right away and the calls left today"""
+    bucket = get_bucket(api_key, plan)
+    calls_per_day = PLANS[plan]["calls_per_day"]
+    return {
+        "calls_now": max(int(bucket["tokens"]), 0),
+        "calls_today": None
+        if calls_per_day is None
+        else calls_per_day - bucket["calls_today"],
+    }
@@ -1,5 +1,7 @@
 """Schema for the input data"""
 
+from shared_code import rate_limit_helper
+
 
 def stock_input() -> dict:
     """Schema for the input data"""
@@ -89,6 +91,14 @@ def user_data() -> dict:
             "dark_mode": {"type": "string", "enum": ["dark", "light", "system"]},
             "clearbit_api_key": {"type": "string", "minLength": 1},
             "alpha_vantage_api_key": {"type": "string", "minLength": 1},
+            "alpha_vantage_plan": {
+                "type": "string",
+                "enum": [
+                    plan
+                    for plan in rate_limit_helper.PLANS
+                    if plan != rate_limit_helper.DEFAULT_PLAN
+                ],
+            },
             "brandfetch_api_key": {"type": "string", "minLength": 1},
             "currency": {"type": "string", "minLength": 1, "maxLength": 3},
         },
@@ -0,0 +1,34 @@
+"""Helper functions to sync output documents by content hash"""
+import hashlib
+import json
+import uuid
+
+# namespace of the deterministic ids of output documents
+NAMESPACE = uuid.UUID("6f1c2f0e-4b8a-4c55-9a43-2d1f6e3b7c90")
+HASH_KEY = "hash"
+
+
+def get_document_id(userid: str, container_name: str, *keys: str) -> str:
+    """Get the id of an output document from its user, container, date and symbol"""
+    return str(uuid.uuid5(NAMESPACE, "/".join([userid, container_name, *keys])))
+
+
+def get_content_hash(item: dict) -> str:
+    """Get the hash of the content of a document, ignoring its id and hash"""
+    content = {key: value for key, value in item.items() if key not in ("id", HASH_KEY)}
+    return hashlib.blake2b(
+        json.dumps(content, sort_keys=True, separators=(",", ":")).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+def add_content_hash(items: list) -> list:
+    """Add the content hash to every document"""
+    for item in items:
+        item[HASH_KEY] = get_content_hash(item)
+    return items
+
+
+def get_changed_items(items: list, existing: dict) -> list:
+    """Get the documents that are new or whose content hash changed"""
+    return [item for item in items if existing.get(item["id"]) != item[HASH_KEY]]
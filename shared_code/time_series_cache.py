@@ -0,0 +1,91 @@
+"""Persistent on-disk cache for Alpha Vantage time series"""
+import json
+import os
+import re
+from bisect import bisect_left
+from datetime import date, timedelta
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from shared_code import time_series_helper
+
+# a compact response holds the last 100 data points, which always covers 100 days
+COMPACT_DAYS = 100
+
+
+def get_cache_key(url: str) -> str | None:
+    """Get the cache key of the symbol or currency pair of an api url, None when it is not a time series"""
+    query = {k: v[0] for k, v in parse_qs(urlsplit(url).query).items()}
+    if "function" not in query:
+        return None
+    if "symbol" in query:
+        name = f"{query['function']}_{query['symbol']}"
+    else:
+        name = f"{query['function']}_{query['from_symbol']}_{query['to_symbol']}"
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def get_cache_path(cache_dir: str, url: str) -> str:
+    """Get the cache file of the symbol or currency pair of an api url"""
+    return os.path.join(cache_dir, f"{get_cache_key(url)}.npz")
+
+
+def get_compact_url(url: str) -> str:
+    """Get the url of the last 100 data points"""
+    return url.replace("outputsize=full", "outputsize=compact")
+
+
+def load_time_series(path: str) -> dict | None:
+    """Load a cached columnar time series"""
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as cache:
+        return {
+            "meta_data": json.loads(str(cache["meta_data"])),
+            "dates": cache["dates"].tolist(),
+            "columns": dict(
+                zip(cache["fields"].tolist(), cache["values"].tolist(), strict=True)
+            ),
+        }
+
+
+def save_time_series(path: str, data: dict) -> None:
+    """Save a columnar time series as compressed arrays"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.savez_compressed(
+            file,
+            dates=np.array(data["dates"]),
+            fields=np.array(list(data["columns"])),
+            values=np.array(list(data["columns"].values()), dtype=np.float64),
+            meta_data=np.array(json.dumps(data["meta_data"])),
+        )
+    os.replace(temp_path, path)
+
+
+def is_recent(data: dict) -> bool:
+    """Check if a compact response is enough to bring a time series up to date"""
+    return data["dates"][-1] >= str(date.today() - timedelta(days=COMPACT_DAYS))
+
+
+def merge_time_series(cached: dict, update: dict) -> dict | None:
+    """Merge the new days of an update into a cached time series, None when the update leaves a gap"""
+    if not update["dates"] or update["dates"][0] > cached["dates"][-1]:
+        return None
+
+    cached = time_series_helper.slice_columns(
+        cached, 0, bisect_left(cached["dates"], update["dates"][0])
+    )
+    meta_data = dict(update["meta_data"])
+    if time_series_helper.get_cutoff(cached) is not None:
+        meta_data["cutoff"] = time_series_helper.get_cutoff(cached)
+    return {
+        "meta_data": meta_data,
+        "dates": cached["dates"] + update["dates"],
+        "columns": {
+            field: cached["columns"][field] + values
+            for field, values in update["columns"].items()
+        },
+    }
@@ -0,0 +1,92 @@
+"""Time series helper functions"""
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+
+def get_as_of_index(
+    dates: list, single_date: str, max_days_back: int | None = None
+) -> int | None:
+    """Get the index of the most recent date on or before a date in a sorted list"""
+    index = bisect_right(dates, single_date) - 1
+    if index < 0:
+        return None
+    if (
+        max_days_back is not None
+        and (date.fromisoformat(single_date) - date.fromisoformat(dates[index])).days
+        > max_days_back
+    ):
+        return None
+    return index
+
+
+def get_as_of_positions(dates: list) -> list:
+    """Get the position of the most recent date for every day between the first and last date of a sorted list"""
+    first_ordinal = date.fromisoformat(dates[0]).toordinal()
+    positions = []
+    for position, single_date in enumerate(dates):
+        offset = date.fromisoformat(single_date).toordinal() - first_ordinal
+        positions.extend([position - 1] * (offset - len(positions)))
+        positions.append(position)
+    return positions
+
+
+def get_time_series_key(data: dict) -> str | None:
+    """Get the key of the time series in an Alpha Vantage response"""
+    return next((key for key in data if key.startswith("Time Series")), None)
+
+
+def get_field_name(field: str) -> str:
+    """Get the column name of an Alpha Vantage field, 7. dividend amount becomes dividend_amount"""
+    return field.split(". ", 1)[-1].replace(" ", "_")
+
+
+def to_columns(data: dict) -> dict:
+    """Convert an Alpha Vantage response to sorted dates and a float array per field"""
+    time_series = data[get_time_series_key(data)]
+    dates = sorted(time_series)
+    fields = sorted(time_series[dates[0]]) if dates else []
+    return {
+        "meta_data": data["Meta Data"],
+        "dates": dates,
+        "columns": {
+            get_field_name(field): [float(time_series[d][field]) for d in dates]
+            for field in fields
+        },
+    }
+
+
+def slice_columns(data: dict, start: int, end: int | None = None) -> dict:
+    """Get the rows between two positions of a columnar time series"""
+    return {
+        "meta_data": data["meta_data"],
+        "dates": data["dates"][start:end],
+        "columns": {
+            field: values[start:end] for field, values in data["columns"].items()
+        },
+    }
+
+
+def filter_columns(data: dict, oldest_date: str) -> dict:
+    """Get the rows of a columnar time series on or after a date"""
+    return slice_columns(data, bisect_left(data["dates"], oldest_date))
+
+
+def get_cutoff(data: dict) -> str | None:
+    """Get the oldest date a time series was downloaded from, None for the full history"""
+    return data["meta_data"].get("cutoff")
+
+
+def covers(data: dict, oldest_date: str | None) -> bool:
+    """Check if a time series holds the history since a date"""
+    cutoff = get_cutoff(data)
+    return cutoff is None or (oldest_date is not None and cutoff <= oldest_date)
+
+
+def get_shared_cutoff(cached: dict | None, oldest_date: str | None) -> str | None:
+    """Get the cutoff of a new download, keeping the history of the cached time series it replaces"""
+    if cached is None:
+        return oldest_date
+    cutoff = get_cutoff(cached)
+    if cutoff is None or oldest_date is None:
+        return None
+    return min(cutoff, oldest_date)
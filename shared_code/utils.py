@@ -16,20 +16,35 @@ def get_unique_items(items: list, key_to_filter: str) -> list:
     return list(dict.fromkeys(output_list))
 
 
+def group_items(items: list, *keys_to_group: str) -> dict:
+    """Group list of dictionaries by one or more keys, keeping the input order"""
+    output = {}
+    for item in items:
+        if len(keys_to_group) == 1:
+            key = item[keys_to_group[0]]
+        else:
+            key = tuple(item[key_to_group] for key_to_group in keys_to_group)
+        output.setdefault(key, []).append(item)
+    return output
+
+
 def get_weighted_average(data: list, weight: list) -> float:
     """Get weighted average"""
     return float(sum(a * b for a, b in zip(data, weight)) / sum(weight))
 
 
 def add_meta_data_to_stock_data(
-    stock_data: list, container_name: str, userid: str
+    stock_data: list,
+    container_name: str,
+    userid: str,
+    fields: list[str] | None = None,
 ) -> list:
-    """Add meta data to stock data"""
+    """Add meta data to stock data, selecting only the given fields when passed"""
 
     container = cosmosdb_module.cosmosdb_container(container_name)
     meta_data = list(
         container.query_items(
-            query="SELECT * FROM c WHERE c.userid = @userid",
+            query=f"{cosmosdb_module.get_select(fields)} FROM c WHERE c.userid = @userid",
             parameters=[
                 {"name": "@userid", "value": userid},
             ],
@@ -29,6 +29,18 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
     logging.info("Step 1: Getting transactions")
     input_data = yield context.call_activity("get_input_data", [userid])
 
+    # step 1.1 - Only compute the dates after a valid checkpoint
+    logging.info("Step 1.1: Getting checkpoint")
+    checkpoint = None
+    if days_to_update != "all":
+        checkpoint = yield context.call_activity(
+            "get_checkpoint", [userid, input_data, days_to_update]
+        )
+    if checkpoint:
+        input_data["daterange"] = [
+            d for d in input_data["daterange"] if d > checkpoint["date"]
+        ]
+
     # Step 2 - Get api data
     logging.info("Step 2.1: Getting api data")
     provisioning_tasks = []
@@ -61,6 +73,7 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
         day_by_day["stock_held"],
         api_data,
         data,  # Only used for return value everything else gets a None value to free up memory
+        checkpoint,
     ) = yield context.call_activity(
         "add_data_to_stocks_held",
         [
@@ -70,6 +83,7 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
             input_data,
             days_to_update,
             userid,
+            checkpoint,
         ],
     )
 
@@ -81,7 +95,7 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
         data,  # Only used for return value everything else gets a None value to free up memory
     ) = yield context.call_activity(
         "calculate_totals",
-        [data, day_by_day["invested"], input_data, userid],
+        [data, day_by_day["invested"], input_data, userid, days_to_update],
     )
 
     # step 7 - output to cosmosdb
@@ -95,6 +109,11 @@ def orchestrator_function(context: df.DurableOrchestrationContext):
     provisioning_tasks.append(provision_task)
     result = (yield context.task_all(provisioning_tasks))[0]
 
+    logging.info("Step 7.1: Output checkpoint to cosmosdb")
+    yield context.call_activity(
+        "output_to_cosmosdb", ["checkpoints", [checkpoint], True]
+    )
+
     logging.info("Step 8: Returning result")
     return result
 
@@ -0,0 +1,74 @@
+"""Function to sync CosmosDB items by content hash"""
+
+import asyncio
+import logging
+from functools import partial
+
+from shared_code import claim_check_helper, cosmosdb_module, sync_helper
+
+
+async def main(payload: list) -> str:
+    """Upsert the changed items of a container and delete the items that are gone"""
+
+    # suppress logger output
+    logger = logging.getLogger("azure")
+    logger.setLevel(logging.CRITICAL)
+
+    # get config
+    container_name: str = payload[0]
+    batches: list = payload[1]
+    days_to_update: str | int = payload[2]
+    userid: str = payload[3]
+
+    logging.info(f"Syncing container {container_name}")
+
+    container = cosmosdb_module.cosmosdb_async_container(container_name)
+    existing = await get_existing_hashes(container, days_to_update, userid)
+
+    # write the changed items batch by batch, remembering every current id
+    ids = set()
+    upsert_item = partial(
+        container.upsert_item, initial_headers=cosmosdb_module.MINIMAL_RESPONSE
+    )
+    reports = []
+    for batch in batches:
+        items = await asyncio.to_thread(claim_check_helper.check_out, batch)
+        ids.update(item["id"] for item in items)
+        reports.append(
+            await cosmosdb_module.write_concurrently(
+                upsert_item, sync_helper.get_changed_items(items, existing)
+            )
+        )
+
+    def delete_item(item: dict, **kwargs):
+        return container.delete_item(item, partition_key=item["id"], **kwargs)
+
+    stale_items = [{"id": item_id} for item_id in existing if item_id not in ids]
+    reports.append(await cosmosdb_module.write_concurrently(delete_item, stale_items))
+
+    logging.info(
+        f"Synced {container_name}: {len(ids)} items,"
+        f" {len(ids) - sum(r['items'] for r in reports[:-1])} unchanged,"
+        f" {len(stale_items)} deleted"
+    )
+    return cosmosdb_module.get_write_result(
+        container_name,
+        {
+            "items": sum(report["items"] for report in reports),
+            "request_charge": sum(report["request_charge"] for report in reports),
+            "failed": [item for report in reports for item in report["failed"]],
+        },
+    )
+
+
+async def get_existing_hashes(
+    container, days_to_update: int | str, userid: str
+) -> dict:
+    """Get the content hash of every item of the user in the update window"""
+    query, parameters = cosmosdb_module.get_user_items_query(
+        days_to_update, userid, ["id", sync_helper.HASH_KEY]
+    )
+    return {
+        item["id"]: item.get(sync_helper.HASH_KEY)
+        async for item in container.query_items(query=query, parameters=parameters)
+    }
@@ -1,10 +1,23 @@
 """Test add data to stocks held."""
 import json
+from datetime import date
 from pathlib import Path
 
-from add_data_to_stocks_held import main
+import numpy as np
+import pytest
+import time_machine
 
+from add_data_to_stocks_held import (
+    create_price_index,
+    divide,
+    get_price_index_position,
+    get_total_dividends,
+    main,
+    merge_realized_unrealized,
+)
 
+
+@time_machine.travel("2023-03-29")
 def test_all():
     """Test with all input"""
     with open(Path(__file__).parent / "data" / "transactions.json", "r") as f:
@@ -41,3 +54,88 @@ def test_all():
         d.pop("id")
 
     assert result[2] == expected_result
+    assert result[3]["id"] == "123"
+    assert result[3]["date"] == "2023-03-28"
+    assert result[3]["total_dividends"] == {
+        d["symbol"]: d["realized"]["total_dividends"]
+        for d in expected_result
+        if d["date"] == "2023-03-28"
+    }
+
+
+def test_price_index():
+    """Test prices are looked up as of the most recent date with stock and forex data"""
+    time_series = {
+        "meta_data": {},
+        "dates": ["2023-03-24", "2023-03-27", "2023-03-28"],
+        "columns": {
+            "open": [1.0, 2.0, 3.0],
+            "high": [1.0, 2.0, 3.0],
+            "low": [1.0, 2.0, 3.0],
+            "close": [1.0, 2.0, 3.0],
+            "dividend_amount": [0.5, 0.0, 0.0],
+        },
+    }
+    forex_time_series = {
+        "meta_data": {},
+        "dates": ["2023-03-24", "2023-03-28"],
+        "columns": {"close": [0.9, 0.8]},
+    }
+
+    price_index = create_price_index(time_series, forex_time_series)
+    assert price_index["close"] == [1.0, 3.0]
+    assert price_index["dividend"] == [0.5, 0.0]
+    assert price_index["forex_close"] == [0.9, 0.8]
+
+    ordinal = date(2023, 3, 27).toordinal()
+    assert get_price_index_position(price_index, ordinal, "ABC") == 0
+    assert get_price_index_position(price_index, ordinal + 1, "ABC") == 1
+    assert get_price_index_position(price_index, ordinal + 5, "ABC") == 1
+    with pytest.raises(KeyError):
+        get_price_index_position(price_index, ordinal - 4, "ABC")
+
+    price_index = create_price_index(time_series, None)
+    assert price_index["close"] == [1.0, 2.0, 3.0]
+    assert price_index["forex_close"] == [1.0, 1.0, 1.0]
+    assert get_price_index_position(price_index, ordinal, "ABC") == 1
+
+
+def test_merge_realized_unrealized():
+    """Test realized and unrealized rows are joined on symbol and date"""
+    realized = [{"symbol": "ABC", "date": "2023-03-28", "currency": "USD"}]
+    unrealized = [
+        {"symbol": "ABC", "date": "2023-03-27", "currency": "USD"},
+        {"symbol": "ABC", "date": "2023-03-28", "currency": "USD"},
+        {"symbol": "XYZ", "date": "2023-03-28", "currency": "EUR"},
+    ]
+
+    result = merge_realized_unrealized(
+        realized, unrealized, ["ABC", "XYZ"], ["2023-03-27", "2023-03-28"]
+    )
+
+    assert [(d["date"], d["symbol"]) for d in result] == [
+        ("2023-03-27", "ABC"),
+        ("2023-03-28", "ABC"),
+        ("2023-03-28", "XYZ"),
+    ]
+    assert result[0]["unrealized"] is unrealized[0]
+    assert result[1]["realized"] is realized[0]
+    assert result[1]["partial_realized"] is True
+    assert result[2]["currency"] == "EUR"
+    assert result[0]["realized"] is result[2]["realized"]
+
+
+def test_get_total_dividends():
+    """Test dividends are summed per symbol in row order"""
+    dividends = np.array([1.0, 0.5, 0.0, 2.0, 0.25])
+    row_symbols = np.array(["ABC", "XYZ", "ABC", "ABC", "XYZ"])
+
+    result = get_total_dividends(dividends, row_symbols, ["ABC", "XYZ"], {})
+
+    assert result.tolist() == [1.0, 0.5, 1.0, 3.0, 0.75]
+
+
+def test_divide():
+    """Test division by zero falls back to 0.0"""
+    result = divide(np.array([1.0, 1.0, 0.0]), np.array([4.0, 0.0, 0.0]))
+    assert result.tolist() == [0.25, 0.0, 0.0]
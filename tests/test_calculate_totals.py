@@ -1,6 +1,7 @@
 """Test the calculate_totals function."""
 
 from calculate_totals import main
+from shared_code import sync_helper
 
 stocks_held = [
     {
@@ -224,7 +225,12 @@ def test_main():
 
     assert result[0] is None
     assert result[1] is None
-    assert result[2]["stocks_held"] == stocks_held
-    for d in result[2]["totals"]:
+    assert result[2]["stocks_held"] == [stocks_held]
+    assert all("hash" in d for d in stocks_held)
+    assert result[2]["totals"][0][0]["id"] == sync_helper.get_document_id(
+        userid, "totals", expected_totals[0]["date"]
+    )
+    for d in result[2]["totals"][0]:
         d.pop("id")
-    assert result[2]["totals"] == expected_totals
+        d.pop("hash")
+    assert result[2]["totals"] == [expected_totals]
@@ -1,63 +1,412 @@
 """Test the call_alphavantage_api module."""
 
-from unittest.mock import MagicMock, patch
+import asyncio
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import aiohttp
 import pytest
-from requests import Response
+import time_machine
+from azure.cosmos import ContainerProxy, exceptions
 
-from call_alphavantage_api import main
+from call_alphavantage_api import TIMEOUT, main, read_response
+from shared_code import rate_limit_helper
 
 
-@patch("requests.get")
-def test_valid_response(mock_get):
+def mock_http_response(data: dict, status: int = 200) -> MagicMock:
+    """Create a mocked response, streamed in small chunks"""
+    body = json.dumps(data, indent=4).encode()
+
+    async def iter_any():
+        for index in range(0, len(body), 7):
+            yield body[index : index + 7]
+
+    response = MagicMock()
+    response.status = status
+    response.json = AsyncMock(return_value=data)
+    response.content.iter_any = iter_any
+    return response
+
+
+def mock_response(mock_get, data: dict, status: int = 200) -> None:
+    """Set the response of the mocked session"""
+    mock_get.return_value.__aenter__.return_value = mock_http_response(data, status)
+
+
+@pytest.fixture(name="mock_get")
+def fixture_mock_get():
+    """Mock the get method of the shared http session"""
+    with patch("shared_code.aio_helper.get_session") as get_session_mock:
+        yield get_session_mock.return_value.get
+
+
+@pytest.fixture(autouse=True)
+def _reset_rate_limit():
+    """Start every test with full rate limit buckets"""
+    rate_limit_helper.buckets.clear()
+
+
+@pytest.fixture(name="mock_sleep", autouse=True)
+def fixture_mock_sleep():
+    """Mock sleeping between retries"""
+    with patch("asyncio.sleep", new_callable=AsyncMock) as sleep_mock:
+        yield sleep_mock
+
+
+@pytest.mark.asyncio()
+async def test_valid_response(mock_get):
     """Test the main function."""
 
     url = "https://foo.bar"
     api_key = "123"
-    mock_response = MagicMock(spec=Response)
-    mock_response.status_code = 200
-    mock_response.json.return_value = {"foo": "bar"}
-    mock_get.return_value = mock_response
+    mock_response(mock_get, {"foo": "bar"})
 
-    result = main([url, api_key])
+    result = await main([url, api_key])
     assert result == {"foo": "bar"}
     assert mock_get.call_count == 1
-    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=10)
+    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=TIMEOUT)
+
+
+@pytest.mark.asyncio()
+async def test_multiple_urls(mock_get):
+    """Test the main function with a list of urls."""
+
+    mock_response(mock_get, {"foo": "bar"})
 
+    result = await main([["https://foo.bar", "https://bar.foo"], "123"])
+    assert result == [{"foo": "bar"}, {"foo": "bar"}]
+    assert mock_get.call_count == 2
+    mock_get.assert_any_call("https://foo.bar&apikey=123", timeout=TIMEOUT)
+    mock_get.assert_any_call("https://bar.foo&apikey=123", timeout=TIMEOUT)
 
-@patch("requests.get")
-@patch("time.sleep")
-def test_http_error(mock_sleep, mock_get):
+
+@pytest.mark.asyncio()
+async def test_http_error(mock_get, mock_sleep):
     """Test the main function."""
 
     url = "https://foo.bar"
     api_key = "123"
-    mock_response = MagicMock(spec=Response)
-    mock_response.status_code = 500
-    mock_response.json.return_value = {"foo": "bar"}
-    mock_get.return_value = mock_response
+    mock_response(mock_get, {"foo": "bar"}, 500)
 
     with pytest.raises(Exception, match="Error: 500"):
-        main([url, api_key])
+        await main([url, api_key])
 
     assert mock_get.call_count == 4
-    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=10)
+    assert [c.args[0] for c in mock_sleep.await_args_list].count(30) == 3
+    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=TIMEOUT)
+
+
+@pytest.mark.asyncio()
+async def test_connection_error(mock_get, mock_sleep):
+    """Test timeouts and connection errors are retried"""
+    mock_get.return_value.__aenter__.side_effect = [
+        asyncio.TimeoutError(),
+        aiohttp.ClientConnectionError(),
+        mock_http_response({"foo": "bar"}),
+    ]
+
+    assert await main(["https://foo.bar", "123"]) == {"foo": "bar"}
+    assert mock_get.call_count == 3
+    assert [c.args[0] for c in mock_sleep.await_args_list].count(30) == 2
 
 
-@patch("requests.get")
-@patch("time.sleep")
-def test_too_many_api_calls(mock_sleep, mock_get):
+@pytest.mark.asyncio()
+async def test_too_many_api_calls(mock_get):
     """Test the main function."""
 
     url = "https://foo.bar"
     api_key = "123"
-    mock_response = MagicMock(spec=Response)
-    mock_response.status_code = 200
-    mock_response.json.return_value = {"Note": "bar"}
-    mock_get.return_value = mock_response
+    mock_response(mock_get, {"Note": "bar"})
 
     with pytest.raises(Exception, match="Too many api calls, Exiting."):
-        main([url, api_key])
+        await main([url, api_key])
 
     assert mock_get.call_count == 19
-    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=10)
+    mock_get.assert_called_with("https://foo.bar&apikey=123", timeout=TIMEOUT)
+
+
+@pytest.mark.asyncio()
+async def test_rate_limit(mock_get, mock_sleep):
+    """Test calls are paced by the rate limit of the plan."""
+
+    mock_response(mock_get, {"foo": "bar"})
+
+    with patch("time.monotonic", return_value=0.0):
+        await main([["https://foo.bar", "https://bar.foo"], "123", "premium_75"])
+
+    assert mock_get.call_count == 2
+    mock_sleep.assert_awaited_once_with(0.8)
+    assert rate_limit_helper.get_remaining("123", "premium_75")["calls_today"] is None
+
+
+url_fx = "https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=USD&to_symbol=EUR&outputsize=full"
+
+
+def mock_time_series(dates: list, close: str) -> dict:
+    """Create a mock time series response"""
+    return {
+        "Meta Data": {"5. Last Refreshed": dates[0]},
+        "Time Series FX (Daily)": {
+            single_date: {"1. open": "1.0000", "4. close": close}
+            for single_date in dates
+        },
+    }
+
+
+def mock_columns(dates: list, closes: list) -> dict:
+    """Create a mock columnar time series"""
+    return {
+        "meta_data": {"5. Last Refreshed": dates[-1]},
+        "dates": dates,
+        "columns": {"open": [1.0] * len(dates), "close": closes},
+    }
+
+
+def mock_market_data(dates: list, close: float, updated: str) -> dict:
+    """Create a mock shared market data item"""
+    return {
+        "id": "FX_DAILY_USD_EUR",
+        "updated": updated,
+        "last_date": dates[-1],
+        **mock_columns(dates, [close] * len(dates)),
+    }
+
+
+def mock_container(cosmosdb_container_mock, item: dict | None) -> MagicMock:
+    """Set the shared market data item of the mocked container"""
+    container = MagicMock(spec=ContainerProxy)
+    if item is None:
+        container.read_item.side_effect = exceptions.CosmosResourceNotFoundError()
+    else:
+        container.read_item.return_value = item
+    cosmosdb_container_mock.return_value = container
+    return container
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_fresh_market_data(cosmosdb_container_mock, mock_get):
+    """Test fresh shared market data is used without calling the api."""
+    container = mock_container(
+        cosmosdb_container_mock,
+        mock_market_data(["2023-04-06", "2023-04-07"], 1.5, "2023-04-08"),
+    )
+
+    result = await main([url_fx, "123"])
+
+    assert result == mock_columns(["2023-04-06", "2023-04-07"], [1.5, 1.5])
+    assert mock_get.call_count == 0
+    cosmosdb_container_mock.assert_called_with("market_data")
+    container.read_item.assert_called_with(
+        item="FX_DAILY_USD_EUR", partition_key="FX_DAILY_USD_EUR"
+    )
+    container.upsert_item.assert_not_called()
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_stale_market_data(cosmosdb_container_mock, mock_get):
+    """Test stale shared market data is updated with a compact response."""
+    container = mock_container(
+        cosmosdb_container_mock,
+        mock_market_data(["2023-04-04", "2023-04-05"], 1.5, "2023-04-05"),
+    )
+    mock_response(mock_get, mock_time_series(["2023-04-06", "2023-04-05"], "2.0000"))
+
+    result = await main([url_fx, "123"])
+
+    mock_get.assert_called_once_with(
+        f"{url_fx.replace('outputsize=full', 'outputsize=compact')}&apikey=123",
+        timeout=TIMEOUT,
+    )
+    assert result == mock_columns(
+        ["2023-04-04", "2023-04-05", "2023-04-06"], [1.5, 2.0, 2.0]
+    )
+    item = container.upsert_item.call_args[0][0]
+    assert item["id"] == "FX_DAILY_USD_EUR"
+    assert item["updated"] == "2023-04-08"
+    assert item["last_date"] == "2023-04-06"
+    assert item["dates"] == ["2023-04-04", "2023-04-05", "2023-04-06"]
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_cached_time_series(
+    cosmosdb_container_mock, mock_get, tmp_path, monkeypatch
+):
+    """Test the local cache is used when there is no shared market data."""
+    monkeypatch.setenv("TIME_SERIES_CACHE_DIR", str(tmp_path))
+    container = mock_container(cosmosdb_container_mock, None)
+
+    # first call gets the full time series
+    mock_response(mock_get, mock_time_series(["2023-04-05", "2023-04-04"], "1.5000"))
+    result = await main([url_fx, "123"])
+    assert result == mock_columns(["2023-04-04", "2023-04-05"], [1.5, 1.5])
+    mock_get.assert_called_with(f"{url_fx}&apikey=123", timeout=TIMEOUT)
+    assert (tmp_path / "FX_DAILY_USD_EUR.npz").exists()
+    assert container.upsert_item.call_count == 1
+
+    # second call only gets the latest days
+    mock_response(mock_get, mock_time_series(["2023-04-06", "2023-04-05"], "2.0000"))
+    result = await main([url_fx, "123"])
+    mock_get.assert_called_with(
+        f"{url_fx.replace('outputsize=full', 'outputsize=compact')}&apikey=123",
+        timeout=TIMEOUT,
+    )
+    assert result == mock_columns(
+        ["2023-04-04", "2023-04-05", "2023-04-06"], [1.5, 2.0, 2.0]
+    )
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_cached_time_series_gap(
+    cosmosdb_container_mock, mock_get, tmp_path, monkeypatch
+):
+    """Test a full time series is fetched when the compact response leaves a gap."""
+    monkeypatch.setenv("TIME_SERIES_CACHE_DIR", str(tmp_path))
+    mock_container(cosmosdb_container_mock, None)
+
+    mock_response(mock_get, mock_time_series(["2023-04-03"], "1.5000"))
+    await main([url_fx, "123"])
+
+    mock_response(mock_get, mock_time_series(["2023-04-06"], "2.0000"))
+    result = await main([url_fx, "123"])
+
+    assert mock_get.call_count == 3
+    mock_get.assert_called_with(f"{url_fx}&apikey=123", timeout=TIMEOUT)
+    assert result == mock_columns(["2023-04-06"], [2.0])
+
+
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_no_time_series(cosmosdb_container_mock, mock_get):
+    """Test an api response without a time series."""
+    mock_container(cosmosdb_container_mock, None)
+    mock_response(mock_get, {"Error Message": "Invalid API call."})
+
+    with pytest.raises(Exception, match="no time series"):
+        await main([url_fx, "123"])
+
+
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_api_requests(cosmosdb_container_mock, mock_get):
+    """Test requests for the same url are downloaded once, then filtered."""
+    mock_container(cosmosdb_container_mock, None)
+    mock_response(
+        mock_get,
+        mock_time_series(["2023-04-06", "2023-04-05", "2023-04-04"], "2.0000"),
+    )
+
+    result = await main(
+        [
+            [
+                {"url": url_fx, "oldest_date": "2023-04-05"},
+                {"url": url_fx, "oldest_date": "2023-04-06"},
+                url_fx,
+            ],
+            "123",
+        ]
+    )
+
+    assert mock_get.call_count == 1
+    assert result[0]["dates"] == ["2023-04-05", "2023-04-06"]
+    assert result[0]["columns"]["close"] == [2.0, 2.0]
+    assert result[1]["dates"] == ["2023-04-06"]
+    assert result[2]["dates"] == ["2023-04-04", "2023-04-05", "2023-04-06"]
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_currency_requests(cosmosdb_container_mock, mock_get):
+    """Test cross rates are derived from the rates against the pivot currency."""
+    mock_container(cosmosdb_container_mock, None)
+    responses = {
+        "GBP": mock_time_series(["2023-04-06", "2023-04-05"], "1.2500"),
+        "EUR": mock_time_series(["2023-04-05", "2023-04-04"], "1.1000"),
+    }
+
+    def get(url, **_):
+        response = mock_http_response(responses[url.split("from_symbol=")[1][:3]])
+        context = MagicMock()
+        context.__aenter__ = AsyncMock(return_value=response)
+        context.__aexit__ = AsyncMock(return_value=None)
+        return context
+
+    mock_get.side_effect = get
+
+    result = await main(
+        [
+            [
+                {"currency": "GBX", "to_currency": "EUR", "oldest_date": "2023-04-01"},
+                {"currency": "GBP", "to_currency": "EUR", "oldest_date": "2023-04-01"},
+                {"currency": "USD", "to_currency": "EUR", "oldest_date": "2023-04-05"},
+                {"currency": "GBX", "to_currency": "GBP", "oldest_date": "2023-04-06"},
+            ],
+            "123",
+        ]
+    )
+
+    # GBP and EUR are both downloaded once against USD
+    assert mock_get.call_count == 2
+    assert result[0]["dates"] == ["2023-04-05", "2023-04-06"]
+    assert result[0]["columns"]["close"] == pytest.approx([1.25 / 1.1 / 100] * 2)
+    assert result[1]["columns"]["close"] == pytest.approx([1.25 / 1.1] * 2)
+    assert result[2]["dates"] == ["2023-04-05"]
+    assert result[2]["columns"]["close"] == pytest.approx([1 / 1.1])
+    assert result[3]["dates"] == ["2023-04-06", "2023-04-07", "2023-04-08"]
+    assert result[3]["columns"]["close"] == [0.01] * 3
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_cutoff(cosmosdb_container_mock, mock_get):
+    """Test days before the oldest date are dropped while reading the response."""
+    container = mock_container(cosmosdb_container_mock, None)
+    mock_response(
+        mock_get,
+        mock_time_series(["2023-04-06", "2023-04-05", "2023-04-04"], "2.0000"),
+    )
+
+    result = await main([[{"url": url_fx, "oldest_date": "2023-04-05"}], "123"])
+
+    assert result[0]["dates"] == ["2023-04-05", "2023-04-06"]
+    item = container.upsert_item.call_args[0][0]
+    assert item["dates"] == ["2023-04-05", "2023-04-06"]
+    assert item["meta_data"]["cutoff"] == "2023-04-05"
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@pytest.mark.asyncio()
+async def test_cutoff_market_data(cosmosdb_container_mock, mock_get):
+    """Test shared market data without enough history is downloaded again."""
+    market_data = mock_market_data(["2023-04-06", "2023-04-07"], 1.5, "2023-04-08")
+    market_data["meta_data"]["cutoff"] = "2023-04-06"
+    mock_container(cosmosdb_container_mock, market_data)
+    mock_response(
+        mock_get,
+        mock_time_series(["2023-04-07", "2023-04-06", "2023-04-05"], "2.0000"),
+    )
+
+    result = await main([[{"url": url_fx, "oldest_date": "2023-04-06"}], "123"])
+    assert result[0]["columns"]["close"] == [1.5, 1.5]
+    assert mock_get.call_count == 0
+
+    result = await main([[{"url": url_fx, "oldest_date": "2023-04-05"}], "123"])
+    assert result[0]["dates"] == ["2023-04-05", "2023-04-06", "2023-04-07"]
+    mock_get.assert_called_once_with(f"{url_fx}&apikey=123", timeout=TIMEOUT)
+
+
+@pytest.mark.asyncio()
+async def test_read_response():
+    """Test reading a streamed response that is not a time series."""
+    response = mock_http_response({"Note": "Too many calls"})
+    assert await read_response(response, "2023-04-05") == {"Note": "Too many calls"}
@@ -1,9 +1,10 @@
 """Test the delete_cosmosdb_items function."""
 
-from unittest.mock import AsyncMock, MagicMock, patch
+import json
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 import pytest
-from azure.cosmos import ContainerProxy
+from azure.cosmos.aio import ContainerProxy
 
 from delete_cosmosdb_items import main
 
@@ -15,7 +16,7 @@ mock_items = [
 
 
 @pytest.mark.asyncio()
-@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
 async def test_all(cosmosdb_container_mock):
     """Test the main function."""
     payload = ["test", mock_items]
@@ -25,9 +26,9 @@ async def test_all(cosmosdb_container_mock):
 
     response = await main(payload)
 
-    assert response == '{"status": "Done"}'
+    assert json.loads(response)["items"] == 1
     assert cosmosdb_container_mock.return_value.delete_item.await_count == 1
     cosmosdb_container_mock.assert_called_with("test")
     cosmosdb_container_mock.return_value.delete_item.assert_called_with(
-        mock_items[0], partition_key=mock_items[0]["id"]
+        mock_items[0], partition_key=mock_items[0]["id"], response_hook=ANY
     )
@@ -0,0 +1,101 @@
+"""Test get_api_data orchestrator"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from get_api_data import get_api_requests, get_oldest_date, orchestrator_function
+from shared_code import rate_limit_helper
+
+symbols = [f"SYM{i}" for i in range(7)]
+currencies = ["USD", "GBX", "GBP"]
+first_dates = {
+    "symbols": {symbol: "2023-04-01" for symbol in symbols},
+    "currencies": {"USD": "2023-04-01", "GBX": "2023-04-02", "GBP": "2023-04-03"},
+}
+
+
+def test_orchestrator_function():
+    """Test api calls are made by an activity per request, bounded by the plan"""
+    context = MagicMock()
+    context.get_input.return_value = {
+        "symbols": symbols,
+        "currencies": currencies,
+        "first_dates": first_dates,
+        "user_data": {
+            "currency": "EUR",
+            "alpha_vantage_api_key": "key",
+            "alpha_vantage_plan": "premium_150",
+        },
+    }
+    context.call_activity.side_effect = lambda name, payload: SimpleNamespace(
+        payload=payload, result=None
+    )
+    context.task_any.side_effect = lambda tasks: ("any", tasks)
+    context.task_all.side_effect = lambda tasks: ("all", tasks)
+
+    def complete(task):
+        task.result = [{"data": task.payload[0][0]}]
+        return task
+
+    generator = orchestrator_function(context)
+    in_flight = []
+    try:
+        kind, tasks = next(generator)
+        while True:
+            in_flight.append(len(tasks))
+            if kind == "any":
+                # the last started call finishes first
+                kind, tasks = generator.send(complete(tasks[-1]))
+            else:
+                generator.send([complete(task).result for task in tasks])
+    except StopIteration as result:
+        output = result.value
+
+    # a request for each of the 7 symbols and 3 currencies, 3 at a time
+    assert context.call_activity.call_count == 10
+    assert set(in_flight) == {rate_limit_helper.get_concurrency("premium_150")}
+    for call in context.call_activity.call_args_list:
+        name, (requests, api_key, plan) = call.args
+        assert name == "call_alphavantage_api"
+        assert len(requests) == 1
+        assert api_key == "key"
+        assert plan == "premium_150"
+
+    api_requests = get_api_requests(symbols, currencies, "EUR", first_dates)
+    assert list(output["stock_data"]) == symbols
+    assert output["stock_data"]["SYM0"] == {"data": api_requests[("stock", "SYM0")]}
+    assert list(output["forex_data"]) == currencies
+    assert output["forex_data"]["GBX"] == {"data": api_requests[("forex", "GBX")]}
+
+
+def test_get_api_requests():
+    """Test get api requests"""
+    first_dates_abc = {
+        "symbols": {"ABC": "2023-04-01"},
+        "currencies": {"USD": "2023-04-02", "GBX": "2023-04-03", "EUR": "2023-04-01"},
+    }
+    api_requests = get_api_requests(
+        ["ABC"], ["USD", "GBX", "EUR"], "EUR", first_dates_abc
+    )
+
+    assert api_requests == {
+        ("stock", "ABC"): {
+            "url": "https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED&symbol=ABC&outputsize=full&datatype=compact",
+            "oldest_date": "2023-03-02",
+        },
+        ("forex", "USD"): {
+            "currency": "USD",
+            "to_currency": "EUR",
+            "oldest_date": "2023-03-03",
+        },
+        ("forex", "GBX"): {
+            "currency": "GBX",
+            "to_currency": "EUR",
+            "oldest_date": "2023-03-04",
+        },
+    }
+
+
+def test_get_oldest_date():
+    """Test get oldest date"""
+    assert get_oldest_date("2023-04-01") == "2023-03-02"
@@ -0,0 +1,105 @@
+"""Test the get_checkpoint function."""
+
+from unittest.mock import MagicMock, patch
+
+import time_machine
+from azure.cosmos import ContainerProxy, exceptions
+
+from add_data_to_stocks_held import create_checkpoint
+from get_checkpoint import main
+from shared_code import checkpoint_helper
+
+input_data = {
+    "transactions": [
+        {"symbol": "ABC", "date": "2023-04-01", "quantity": 1},
+        {"symbol": "ABC", "date": "2023-04-07", "quantity": 2},
+    ],
+    "user_data": {"currency": "EUR"},
+}
+
+
+def mock_checkpoint(checkpoint_date: str, fingerprint: str | None = None) -> dict:
+    """Create a mock checkpoint"""
+    if fingerprint is None:
+        fingerprint = checkpoint_helper.get_fingerprint(
+            input_data["transactions"], "EUR", checkpoint_date
+        )
+    return {
+        "id": "123",
+        "userid": "123",
+        "date": checkpoint_date,
+        "fingerprint": fingerprint,
+        "total_dividends": {"ABC": 1.5},
+    }
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+def test_valid_checkpoint(cosmosdb_container_mock):
+    """Test a checkpoint before the first date to update"""
+    cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
+    cosmosdb_container_mock.return_value.query_items.return_value = [
+        mock_checkpoint("2023-04-06")
+    ]
+
+    result = main(["123", input_data, 1])
+
+    assert result == {"date": "2023-04-06", "total_dividends": {"ABC": 1.5}}
+    cosmosdb_container_mock.assert_called_with("checkpoints")
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+def test_invalid_checkpoint(cosmosdb_container_mock):
+    """Test checkpoints that can not be used"""
+    cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
+    query_items = cosmosdb_container_mock.return_value.query_items
+
+    query_items.return_value = []
+    assert main(["123", input_data, 1]) is None
+
+    query_items.return_value = [mock_checkpoint("2023-04-07")]
+    assert main(["123", input_data, 1]) is None
+
+    query_items.return_value = [mock_checkpoint("2023-04-06", "abc")]
+    assert main(["123", input_data, 1]) is None
+
+    query_items.return_value = [mock_checkpoint("2023-04-06")]
+    assert main(["123", input_data, 3]) is None
+
+
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+def test_checkpoint_of_previous_update(cosmosdb_container_mock):
+    """Test a 7 day update uses the checkpoint of the 7 day update of the day before"""
+    stocks = [
+        {"date": "2023-03-31", "symbol": "ABC", "realized": {"total_dividends": 1.5}},
+        {"date": "2023-04-07", "symbol": "ABC", "realized": {"total_dividends": 2.5}},
+    ]
+    with time_machine.travel("2023-04-08"):
+        checkpoint = create_checkpoint(stocks, input_data, 7, "123", {})
+    assert checkpoint["date"] == "2023-03-31"
+    assert checkpoint["total_dividends"] == {"ABC": 1.5}
+
+    cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
+    cosmosdb_container_mock.return_value.query_items.return_value = [checkpoint]
+    with time_machine.travel("2023-04-09"):
+        result = main(["123", input_data, 7])
+
+    assert result == {"date": "2023-03-31", "total_dividends": {"ABC": 1.5}}
+
+
+@time_machine.travel("2023-04-08")
+@patch("shared_code.cosmosdb_module.cosmosdb_container")
+def test_missing_container(cosmosdb_container_mock):
+    """Test a deployment without a checkpoints container updates all dates"""
+    cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
+    cosmosdb_container_mock.return_value.query_items.side_effect = (
+        exceptions.CosmosResourceNotFoundError()
+    )
+
+    assert main(["123", input_data, 1]) is None
+
+
+def test_all():
+    """Test a full update does not use a checkpoint"""
+    assert main(["123", input_data, "all"]) is None
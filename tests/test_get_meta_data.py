@@ -1,13 +1,50 @@
 """Test get_meta_data function"""
 
-from unittest.mock import Mock, patch
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
 
+import aiohttp
+import pytest
 import time_machine
+from azure.cosmos import ContainerProxy, exceptions
 
-from get_meta_data import call_brandfetch_api, call_clearbit_api, main
+from get_meta_data import (
+    TIMEOUT,
+    call_brandfetch_api,
+    call_clearbit_api,
+    get_domains,
+    main,
+)
 
 
-def test_no_symbols():
+def mock_response(mock_get, data: dict, status: int = 200) -> None:
+    """Set the response of the mocked session"""
+    response = MagicMock()
+    response.status = status
+    response.json = AsyncMock(return_value=data)
+    mock_get.return_value.__aenter__.return_value = response
+
+
+@pytest.fixture(name="container", autouse=True)
+def fixture_container():
+    """Mock the shared company data container without any items"""
+    container = MagicMock(spec=ContainerProxy)
+    container.read_item.side_effect = exceptions.CosmosResourceNotFoundError()
+    with patch(
+        "shared_code.cosmosdb_module.cosmosdb_container", return_value=container
+    ):
+        yield container
+
+
+@pytest.fixture(name="mock_get")
+def fixture_mock_get():
+    """Mock the get method of the shared http session"""
+    with patch("shared_code.aio_helper.get_session") as get_session_mock:
+        yield get_session_mock.return_value.get
+
+
+@pytest.mark.asyncio()
+async def test_no_symbols():
     """test_no_symbols"""
     payload = [
         [],
@@ -19,14 +56,15 @@ def test_no_symbols():
         "userid",
     ]
 
-    result = main(payload)
+    result = await main(payload)
     assert result == []
 
 
 @time_machine.travel("2023-05-31")
-@patch("get_meta_data.call_clearbit_api")
-@patch("get_meta_data.call_brandfetch_api")
-def test_main(mock_brandfetch_api, mock_clearbit_api):
+@patch("get_meta_data.call_clearbit_api", new_callable=AsyncMock)
+@patch("get_meta_data.call_brandfetch_api", new_callable=AsyncMock)
+@pytest.mark.asyncio()
+async def test_main(mock_brandfetch_api, mock_clearbit_api, container):
     """test_main"""
 
     mock_clearbit_api.return_value = {
@@ -80,7 +118,7 @@ def test_main(mock_brandfetch_api, mock_clearbit_api):
         {"clearbit_api_key": "123", "brandfetch_api_key": "456"},
         "user123",
     )
-    result = main(payload)
+    result = await main(payload)
 
     expected_result = [
         {
@@ -119,12 +157,15 @@ def test_main(mock_brandfetch_api, mock_clearbit_api):
         item.pop("id")
 
     assert result == expected_result
+    assert container.upsert_item.call_count == 2
+    assert container.upsert_item.call_args[0][0]["id"] == "google.com"
 
 
 @time_machine.travel("2023-05-31")
-@patch("get_meta_data.call_clearbit_api")
-@patch("get_meta_data.call_brandfetch_api")
-def test_main_no_images(mock_brandfetch_api, mock_clearbit_api):
+@patch("get_meta_data.call_clearbit_api", new_callable=AsyncMock)
+@patch("get_meta_data.call_brandfetch_api", new_callable=AsyncMock)
+@pytest.mark.asyncio()
+async def test_main_no_images(mock_brandfetch_api, mock_clearbit_api):
     """test_main"""
 
     mock_clearbit_api.return_value = {
@@ -151,7 +192,7 @@ def test_main_no_images(mock_brandfetch_api, mock_clearbit_api):
         {"clearbit_api_key": "123", "brandfetch_api_key": "456"},
         "user123",
     )
-    result = main(payload)
+    result = await main(payload)
 
     expected_result = [
         {
@@ -193,9 +234,10 @@ def test_main_no_images(mock_brandfetch_api, mock_clearbit_api):
 
 
 @time_machine.travel("2023-05-31")
-@patch("get_meta_data.call_clearbit_api")
-@patch("get_meta_data.call_brandfetch_api")
-def test_main_dark_images(mock_brandfetch_api, mock_clearbit_api):
+@patch("get_meta_data.call_clearbit_api", new_callable=AsyncMock)
+@patch("get_meta_data.call_brandfetch_api", new_callable=AsyncMock)
+@pytest.mark.asyncio()
+async def test_main_dark_images(mock_brandfetch_api, mock_clearbit_api):
     """test_main"""
 
     mock_clearbit_api.return_value = {
@@ -235,7 +277,7 @@ def test_main_dark_images(mock_brandfetch_api, mock_clearbit_api):
         {"clearbit_api_key": "123", "brandfetch_api_key": "456"},
         "user123",
     )
-    result = main(payload)
+    result = await main(payload)
 
     expected_result = [
         {
@@ -276,49 +318,139 @@ def test_main_dark_images(mock_brandfetch_api, mock_clearbit_api):
     assert result == expected_result
 
 
+@time_machine.travel("2023-05-31")
+@patch("get_meta_data.call_clearbit_api", new_callable=AsyncMock)
+@patch("get_meta_data.call_brandfetch_api", new_callable=AsyncMock)
+@pytest.mark.asyncio()
+async def test_main_api_errors(mock_brandfetch_api, mock_clearbit_api, container):
+    """Test a symbol without data from the APIs still gets meta data"""
+    mock_clearbit_api.return_value = None
+    mock_brandfetch_api.return_value = None
+
+    payload = (
+        ["AAPL"],
+        [{"symbol": "AAPL", "domain": "apple.com"}],
+        {"clearbit_api_key": "123", "brandfetch_api_key": "456"},
+        "user123",
+    )
+    result = await main(payload)
+
+    assert result[0]["domain"] == "apple.com"
+    assert result[0]["name"] is None
+    assert result[0]["logo"] is None
+    # expired, so the next run retries the APIs
+    assert result[0]["expiry"] == "2023-05-30"
+    mock_clearbit_api.assert_awaited_once_with(
+        "https://company.clearbit.com/v2/companies/find?domain=apple.com", "123"
+    )
+    mock_brandfetch_api.assert_awaited_once_with(
+        "https://api.brandfetch.io/v2/brands/apple.com", "456"
+    )
+    container.upsert_item.assert_not_called()
+
+
+@time_machine.travel("2023-05-31")
+@patch("get_meta_data.call_clearbit_api", new_callable=AsyncMock)
+@patch("get_meta_data.call_brandfetch_api", new_callable=AsyncMock)
+@pytest.mark.asyncio()
+async def test_main_shared_company_data(
+    mock_brandfetch_api, mock_clearbit_api, container
+):
+    """Test meta data is made from fresh shared company data without calling the APIs"""
+    container.read_item.side_effect = None
+    container.read_item.return_value = {
+        "id": "google.com",
+        "expiry": "2023-06-15",
+        "name": "Alphabet Inc.",
+        "domain": "google.com",
+        "_etag": "123",
+    }
+
+    payload = (
+        ["GOOG", "GOOGL"],
+        [
+            {"symbol": "GOOG", "domain": "google.com"},
+            {"symbol": "GOOGL", "domain": "google.com"},
+        ],
+        {"clearbit_api_key": "123", "brandfetch_api_key": "456"},
+        "user123",
+    )
+    result = await main(payload)
+
+    container.read_item.assert_called_once_with(
+        item="google.com", partition_key="google.com"
+    )
+    mock_clearbit_api.assert_not_awaited()
+    mock_brandfetch_api.assert_not_awaited()
+    assert [item["symbol"] for item in result] == ["GOOG", "GOOGL"]
+    assert result[1]["name"] == "Alphabet Inc."
+    assert result[1]["expiry"] == "2023-06-15"
+    assert result[1]["userid"] == "user123"
+    assert "_etag" not in result[1]
+
+
+def test_get_domains():
+    """Test the domain of a symbol comes from its first transaction"""
+    transactions = [
+        {"symbol": "AAPL", "domain": "apple.com"},
+        {"symbol": "GOOG", "domain": "google.com"},
+        {"symbol": "AAPL", "domain": "apple.nl"},
+    ]
+    assert get_domains(transactions) == {"AAPL": "apple.com", "GOOG": "google.com"}
+
+
 class TestApiCalls:
     """TestApiCalls"""
 
-    @patch("requests.get")
-    def test_call_clearbit_api(self, mock_get):
+    @pytest.mark.asyncio()
+    async def test_call_clearbit_api(self, mock_get):
         """test_call_clearbit_api"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"name": "John Doe"}
-        mock_get.return_value = mock_response
+        mock_response(mock_get, {"name": "John Doe"})
 
-        result = call_clearbit_api("https://clearbit.com", "123")
+        result = await call_clearbit_api("https://clearbit.com", "123")
         assert result == {"name": "John Doe"}
-
-    @patch("requests.get")
-    def test_call_brandfetch_api(self, mock_get):
+        mock_get.assert_called_once_with(
+            "https://clearbit.com",
+            headers={"Authorization": "Bearer 123"},
+            timeout=TIMEOUT,
+        )
+
+    @pytest.mark.asyncio()
+    async def test_call_brandfetch_api(self, mock_get):
         """test_call_brandfetch_api"""
-        mock_response = Mock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"name": "John Doe"}
-        mock_get.return_value = mock_response
+        mock_response(mock_get, {"name": "John Doe"})
 
-        result = call_brandfetch_api("https://brandfetch.com", "123")
+        result = await call_brandfetch_api("https://brandfetch.com", "123")
         assert result == {"name": "John Doe"}
 
-    @patch("requests.get")
-    def test_call_brandfetch_error(self, mock_get):
+    @pytest.mark.asyncio()
+    async def test_call_brandfetch_error(self, mock_get):
         """test_call_brandfetch_error"""
-        mock_response = Mock()
-        mock_response.status_code = 404
-        mock_response.json.return_value = {"name": "John Doe"}
-        mock_get.return_value = mock_response
+        mock_response(mock_get, {"name": "John Doe"}, 404)
 
-        result = call_brandfetch_api("https://brandfetch.com", "123")
+        result = await call_brandfetch_api("https://brandfetch.com", "123")
         assert result is None
 
-    @patch("requests.get")
-    def test_call_clearbit_error(self, mock_get):
+    @pytest.mark.asyncio()
+    async def test_call_clearbit_error(self, mock_get):
         """test_call_clearbit_error"""
-        mock_response = Mock()
-        mock_response.status_code = 404
-        mock_response.json.return_value = {"name": "John Doe"}
-        mock_get.return_value = mock_response
+        mock_response(mock_get, {"name": "John Doe"}, 404)
 
-        result = call_clearbit_api("https://clearbit.com", "123")
+        result = await call_clearbit_api("https://clearbit.com", "123")
         assert result is None
+
+    @pytest.mark.asyncio()
+    async def test_call_api_exception(self, mock_get):
+        """Test timeouts, connection errors and non json bodies leave the fields empty"""
+        mock_get.return_value.__aenter__.side_effect = asyncio.TimeoutError()
+        assert await call_clearbit_api("https://clearbit.com", "123") is None
+
+        mock_get.return_value.__aenter__.side_effect = aiohttp.ClientConnectionError()
+        assert await call_brandfetch_api("https://brandfetch.com", "123") is None
+
+        mock_get.return_value.__aenter__.side_effect = None
+        mock_response(mock_get, {})
+        mock_get.return_value.__aenter__.return_value.json.side_effect = (
+            aiohttp.ContentTypeError(MagicMock(), ())
+        )
+        assert await call_clearbit_api("https://clearbit.com", "123") is None
@@ -127,6 +127,11 @@ def test_get_transactions(cosmosdb_container_mock):
     ]
     assert result["daterange"] == daterange
     assert result["symbols"] == ["AMD", "MSFT"]
+    assert result["currencies"] == ["USD"]
+    assert result["first_dates"] == {
+        "symbols": {"AMD": "2021-01-01", "MSFT": "2022-01-01"},
+        "currencies": {"USD": "2021-01-01"},
+    }
     assert result["user_data"] == {
         "id": "123",
         "dark_mode": True,
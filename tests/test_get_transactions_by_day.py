@@ -2,7 +2,14 @@
 import json
 from pathlib import Path
 
-from get_transactions_by_day import main
+import pytest
+
+from get_transactions_by_day import (
+    get_day_by_day_transactions,
+    get_forex_rate,
+    get_invested_by_day,
+    main,
+)
 
 invested_result = [
     {
@@ -42,3 +49,95 @@ def test_main_function():
         d.pop("id")
     assert result["invested"] == invested_result
     assert result["stock_held"] == stocks_held_result
+
+
+def test_get_day_by_day_transactions():
+    """Test lots are carried forward between transactions."""
+    transactions = [
+        {
+            "symbol": "ABC",
+            "transaction_type": "Sell",
+            "quantity": 4,
+            "cost": 80,
+            "cost_per_share": 20,
+            "cost_foreign": 80,
+            "cost_per_share_foreign": 20,
+            "transaction_cost": 0.5,
+            "transaction_date": "2023-03-29",
+        },
+        {
+            "symbol": "ABC",
+            "transaction_type": "Buy",
+            "quantity": 10,
+            "cost": 100,
+            "cost_per_share": 10,
+            "cost_foreign": 100,
+            "cost_per_share_foreign": 10,
+            "transaction_cost": 0.5,
+            "transaction_date": "2023-03-27",
+        },
+    ]
+    daterange = ["2023-03-27", "2023-03-28", "2023-03-29"]
+
+    result = get_day_by_day_transactions(transactions, daterange)
+
+    assert [d["date"] for d in result["unrealized"]] == daterange
+    assert [d["quantity"] for d in result["unrealized"]] == [10, 10, 6]
+    assert result["unrealized"][2]["transaction_cost"] == 0.0
+    assert [(d["transaction_type"], d["quantity"]) for d in result["realized"]] == [
+        ("Buy", 4),
+        ("Sell", 4),
+    ]
+    assert all(d["date"] == "2023-03-29" for d in result["realized"])
+    assert transactions[1]["quantity"] == 10
+
+
+def test_get_forex_rate():
+    """Test forex rates are resolved as of the transaction date."""
+    forex_data = {
+        "USD": {
+            "meta_data": {},
+            "dates": ["2022-11-01", "2023-03-24", "2023-03-27"],
+            "columns": {"close": [1.01, 0.929, 0.9259]},
+        }
+    }
+
+    assert get_forex_rate(forex_data, "USD", "2023-03-27") == 0.9259
+    assert get_forex_rate(forex_data, "USD", "2023-03-26") == 0.929
+    assert get_forex_rate(forex_data, "USD", "2022-11-05") == 1.01
+
+    with pytest.raises(KeyError):
+        get_forex_rate(forex_data, "USD", "2022-10-31")
+    with pytest.raises(KeyError):
+        get_forex_rate(forex_data, "USD", "2023-03-01")
+
+
+def test_get_invested_by_day():
+    """Test invested is a running total of deposits and withdrawals."""
+    invested = [
+        {
+            "transaction_type": "Deposit",
+            "amount": 500,
+            "transaction_date": "2023-03-28",
+        },
+        {
+            "transaction_type": "Withdrawal",
+            "amount": 100,
+            "transaction_date": "2023-03-26",
+        },
+        {
+            "transaction_type": "Deposit",
+            "amount": 250,
+            "transaction_date": "2023-03-29",
+        },
+    ]
+    daterange = ["2023-03-27", "2023-03-28", "2023-03-29"]
+
+    result = get_invested_by_day(invested, daterange)
+
+    for d in result:
+        d.pop("id")
+    assert result == [
+        {"date": "2023-03-28", "invested": 400},
+        {"date": "2023-03-29", "invested": 650},
+    ]
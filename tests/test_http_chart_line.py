@@ -202,6 +202,11 @@ class TestValidRequest:
         response = main(req)
         assert response.get_body() == json.dumps(expected_body).encode("utf-8")
         assert response.status_code == 200
+        mock_cosmosdb_container.return_value.query_items.assert_called_once_with(
+            query='SELECT c.date, c.total_invested, {"total_value": c.unrealized.total_value, "total_pl": c.unrealized.total_pl} AS unrealized FROM c WHERE c.userid = @userid',
+            parameters=[{"name": "@userid", "value": "123"}],
+            enable_cross_partition_query=True,
+        )
 
     @time_machine.travel("2023-05-04")
     @patch("shared_code.utils.get_user")
@@ -13,8 +13,10 @@ from shared_code.utils import create_params_func_request
 with open(Path(__file__).parent / "data" / "get_user_data.json", "r") as f:
     mock_get_user_data = json.load(f)
 
+SELECT = "SELECT c.id, c.date, c.symbol, c.currency, c.fully_realized, c.partial_realized, c.realized, c.unrealized, c.combined, c.weight"
 
-def add_meta_data(result, container_name, userid):
+
+def add_meta_data(result, container_name, userid, fields=None):
     """ "Add meta data to result"""
     for item in result:
         item["meta"] = {
@@ -147,7 +149,7 @@ class TestValidRequest:
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.read_all_items.assert_not_called()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where c.userid = @userid and c.date > @start_date and c.date < @end_date",
+            query=f"{SELECT} FROM c WHERE c.userid = @userid and c.date > @start_date and c.date < @end_date",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": None},
@@ -191,7 +193,7 @@ class TestValidRequest:
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.read_all_items.assert_not_called()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where c.userid = @userid and c.date > @start_date and c.date < @end_date and c.symbol = @symbol",
+            query=f"{SELECT} FROM c WHERE c.userid = @userid and c.date > @start_date and c.date < @end_date and c.symbol = @symbol",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": None},
@@ -229,7 +231,7 @@ class TestValidRequest:
         assert result.get_body() == json.dumps(excepted_result).encode()
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
+            query=f"{SELECT} FROM c WHERE c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": True},
@@ -271,7 +273,7 @@ class TestValidRequest:
         assert result.get_body() == json.dumps(excepted_result).encode()
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where c.partial_realized = @partial_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
+            query=f"{SELECT} FROM c WHERE c.partial_realized = @partial_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": None},
@@ -319,7 +321,7 @@ class TestValidRequest:
         assert result.get_body() == json.dumps(excepted_result).encode()
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where (c.partial_realized = @partial_realized or c.fully_realized = @fully_realized) and c.userid = @userid and c.date > @start_date and c.date < @end_date",
+            query=f"{SELECT} FROM c WHERE (c.partial_realized = @partial_realized or c.fully_realized = @fully_realized) and c.userid = @userid and c.date > @start_date and c.date < @end_date",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": True},
@@ -367,7 +369,7 @@ class TestValidRequest:
         assert result.get_body() == json.dumps(excepted_result).encode()
         cosmosdb_container.return_value.query_items.assert_called_once()
         cosmosdb_container.return_value.query_items.assert_called_once_with(
-            query="select * from c where c.partial_realized = @partial_realized and c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
+            query=f"{SELECT} FROM c WHERE c.partial_realized = @partial_realized and c.fully_realized = @fully_realized and c.userid = @userid and c.date > @start_date and c.date < @end_date",
             parameters=[
                 {"name": "@userid", "value": "123"},
                 {"name": "@fully_realized", "value": True},
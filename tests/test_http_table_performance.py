@@ -17,7 +17,7 @@ with open(Path(__file__).parent / "data" / "get_user_data.json", "r") as f:
     mock_get_user_data = json.load(f)
 
 
-def add_meta_data(result, container, userid):
+def add_meta_data(result, container, userid, fields=None):
     """ "Add meta data to result"""
     for item in result:
         item["meta"] = {
@@ -1,11 +1,13 @@
 """Test the output_to_cosmosdb function."""
 
-from unittest.mock import AsyncMock, MagicMock, patch
+import json
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
 
 import pytest
-from azure.cosmos import ContainerProxy
+from azure.cosmos.aio import ContainerProxy
 
 from output_to_cosmosdb import main
+from shared_code import cosmosdb_module
 
 mock_items = [
     {
@@ -15,17 +17,62 @@ mock_items = [
 
 
 @pytest.mark.asyncio()
-@patch("shared_code.cosmosdb_module.cosmosdb_container")
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
 async def test_all(cosmosdb_container_mock):
     """Test the main function."""
     payload = ["test", mock_items]
 
+    async def create_item(item, response_hook, **_):
+        response_hook({"x-ms-request-charge": "6.29"}, None)
+
     cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
-    cosmosdb_container_mock.return_value.create_item = AsyncMock()
+    cosmosdb_container_mock.return_value.create_item = AsyncMock(
+        side_effect=create_item
+    )
 
     response = await main(payload)
 
-    assert response == '{"status": "Done"}'
+    assert json.loads(response) == {
+        "status": "Done",
+        "items": 1,
+        "request_charge": 6.29,
+    }
     assert cosmosdb_container_mock.return_value.create_item.await_count == 1
     cosmosdb_container_mock.assert_called_with("test")
-    cosmosdb_container_mock.return_value.create_item.assert_called_with(mock_items[0])
+    cosmosdb_container_mock.return_value.create_item.assert_called_with(
+        mock_items[0],
+        initial_headers=cosmosdb_module.MINIMAL_RESPONSE,
+        response_hook=ANY,
+    )
+
+
+@pytest.mark.asyncio()
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
+async def test_upsert(cosmosdb_container_mock):
+    """Test the main function with upsert."""
+    payload = ["test", mock_items, True]
+
+    cosmosdb_container_mock.return_value = MagicMock(spec=ContainerProxy)
+    cosmosdb_container_mock.return_value.upsert_item = AsyncMock()
+
+    response = await main(payload)
+
+    assert json.loads(response)["status"] == "Done"
+    cosmosdb_container_mock.return_value.upsert_item.assert_called_with(
+        mock_items[0],
+        initial_headers=cosmosdb_module.MINIMAL_RESPONSE,
+        response_hook=ANY,
+    )
+    cosmosdb_container_mock.return_value.create_item.assert_not_called()
+
+
+@pytest.mark.asyncio()
+@patch("shared_code.cosmosdb_module.container_function_with_back_off")
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
+async def test_failed(cosmosdb_container_mock, back_off_mock):
+    """Test the activity fails when items could not be written."""
+    payload = ["test", [{"id": "1"}, {"id": "2"}]]
+    back_off_mock.side_effect = [None, Exception("Max retries reached")]
+
+    with pytest.raises(Exception, match="Failed to write 1 of 2 items to test"):
+        await main(payload)
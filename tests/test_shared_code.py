@@ -12,14 +12,24 @@ from unittest.mock import patch
 import azure.functions as func
 import pandas as pd
 import pytest
+import time_machine
 from azure.cosmos import exceptions
 
 from shared_code import (
     aio_helper,
+    checkpoint_helper,
+    claim_check_helper,
+    company_data_helper,
     cosmosdb_module,
     date_time_helper,
+    fx_helper,
     get_config,
+    market_data_helper,
+    rate_limit_helper,
     schemas,
+    sync_helper,
+    time_series_cache,
+    time_series_helper,
     utils,
 )
 
@@ -40,9 +50,46 @@ async def test_gather_with_concurrency():
     assert result == [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
 
 
+@pytest.mark.asyncio()
+async def test_get_session():
+    """Test the http session is shared until it is closed"""
+    session = aio_helper.get_session()
+    assert aio_helper.get_session() is session
+
+    await aio_helper.close_session()
+    assert session.closed
+    new_session = aio_helper.get_session()
+    assert new_session is not session
+    await aio_helper.close_session()
+    assert new_session.closed
+
+
+def test_get_session_closed_with_loop():
+    """Test the http session is closed when its event loop shuts down"""
+
+    async def get_session():
+        return aio_helper.get_session()
+
+    session = asyncio.run(get_session())
+    assert session.closed
+
+
 class TestCosmosdbModule:
     """Test cosmosdb module"""
 
+    @pytest.fixture(autouse=True)
+    def _reset_registry(self):
+        """Start every test without cached clients and containers"""
+        cosmosdb_module.clients.clear()
+        cosmosdb_module.containers.clear()
+        cosmosdb_module.async_clients.clear()
+        cosmosdb_module.async_closers.clear()
+        yield
+        cosmosdb_module.clients.clear()
+        cosmosdb_module.containers.clear()
+        cosmosdb_module.async_clients.clear()
+        cosmosdb_module.async_closers.clear()
+
     @mock.patch("shared_code.get_config.get_cosmosdb")
     @mock.patch("azure.cosmos.cosmos_client.CosmosClient")
     def test_cosmosdb_client(self, mock_cosmos_client, mock_get_cosmosdb):
@@ -62,6 +109,10 @@ class TestCosmosdbModule:
         mock_cosmos_client.assert_called_once_with("mock_endpoint", "mock_key")
         assert client == mock_client
 
+        # the client is reused by later calls
+        assert cosmosdb_module.cosmosdb_client() is client
+        mock_cosmos_client.assert_called_once()
+
     @mock.patch("shared_code.cosmosdb_module.cosmosdb_client")
     @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
     def test_cosmosdb_database(self, mock_get_cosmosdb, mock_cosmosdb_client):
@@ -77,14 +128,90 @@ class TestCosmosdbModule:
         assert result == mock_database_client
 
     @mock.patch("shared_code.cosmosdb_module.cosmosdb_database")
-    def test_cosmosdb_container(self, mock_cosmosdb_database):
+    @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
+    def test_cosmosdb_container(self, mock_get_cosmosdb, mock_cosmosdb_database):
         """Test cosmosdb container"""
-        # mock_get_config = mock_get_config.return_value
+        mock_get_cosmosdb.return_value = {"endpoint": "a", "database": "b"}
         mock_database = mock_cosmosdb_database.return_value
         mock_container_client = mock_database.get_container_client.return_value
         result = cosmosdb_module.cosmosdb_container("mock container name")
         assert result == mock_container_client
 
+        # the container handle is reused by later calls
+        assert cosmosdb_module.cosmosdb_container("mock container name") is result
+        mock_database.get_container_client.assert_called_once()
+
+    @pytest.mark.asyncio()
+    @mock.patch("azure.cosmos.aio.CosmosClient")
+    @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
+    async def test_cosmosdb_async_container(
+        self, mock_get_cosmosdb, mock_async_cosmos_client
+    ):
+        """Test the async client is reused on the same event loop"""
+        mock_get_cosmosdb.return_value = {"endpoint": "a", "key": "k", "database": "b"}
+        mock_async_cosmos_client.return_value.close = mock.AsyncMock()
+
+        container = cosmosdb_module.cosmosdb_async_container("totals")
+        cosmosdb_module.cosmosdb_async_container("stocks_held")
+
+        mock_async_cosmos_client.assert_called_once_with("a", "k")
+        database = mock_async_cosmos_client.return_value.get_database_client
+        database.assert_called_with("b")
+        assert container == database.return_value.get_container_client.return_value
+
+        await cosmosdb_module.close_async_clients()
+        mock_async_cosmos_client.return_value.close.assert_awaited()
+        assert not cosmosdb_module.async_clients
+
+    @mock.patch("azure.cosmos.aio.CosmosClient")
+    @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
+    def test_cosmosdb_async_client_closed_with_loop(
+        self, mock_get_cosmosdb, mock_async_cosmos_client
+    ):
+        """Test the async client of a closed event loop is closed and replaced"""
+        mock_get_cosmosdb.return_value = {"endpoint": "a", "key": "k", "database": "b"}
+        stale_client, new_client = mock.MagicMock(), mock.MagicMock()
+        stale_client.close = mock.AsyncMock()
+        new_client.close = mock.AsyncMock()
+        mock_async_cosmos_client.side_effect = [stale_client, new_client]
+
+        async def get_client():
+            return cosmosdb_module.cosmosdb_async_client()
+
+        assert asyncio.run(get_client()) is stale_client
+        stale_client.close.assert_awaited_once()
+
+        assert asyncio.run(get_client()) is new_client
+        assert len(cosmosdb_module.async_clients) == 1
+
+    @mock.patch("shared_code.cosmosdb_module.cosmosdb_database")
+    @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
+    def test_warm_up(self, mock_get_cosmosdb, mock_cosmosdb_database):
+        """Test warm up creates the container handles"""
+        mock_get_cosmosdb.return_value = {"endpoint": "a", "database": "b"}
+        cosmosdb_module.warm_up(["stocks_held", "totals"])
+        assert list(cosmosdb_module.containers) == [
+            ("a", "b", "stocks_held"),
+            ("a", "b", "totals"),
+        ]
+
+    @mock.patch("shared_code.cosmosdb_module.get_config.get_cosmosdb")
+    def test_warm_up_without_config(self, mock_get_cosmosdb):
+        """Test warm up leaves creating the handles to the first request on errors"""
+        mock_get_cosmosdb.side_effect = KeyError("COSMOSDB_ENDPOINT")
+        cosmosdb_module.warm_up(["stocks_held"])
+        assert not cosmosdb_module.containers
+
+    def test_get_select(self):
+        """Test select clause keeps the nesting of dotted fields"""
+        assert cosmosdb_module.get_select() == "SELECT *"
+        assert (
+            cosmosdb_module.get_select(
+                ["date", "realized.dividend", "realized.total_pl", "a.b.c"]
+            )
+            == 'SELECT c.date, {"dividend": c.realized.dividend, "total_pl": c.realized.total_pl} AS realized, {"b": {"c": c.a.b.c}} AS a'
+        )
+
     @pytest.mark.asyncio()
     async def test_container_function_with_back_off(self):
         """Test container function with back off"""
@@ -112,6 +239,30 @@ class TestCosmosdbModule:
         )
         function.assert_called_once()
 
+        # throttling and unavailable errors are retried
+        for status_code in cosmosdb_module.RETRY_STATUS_CODES:
+            function.reset_mock()
+            function.side_effect = [
+                exceptions.CosmosHttpResponseError(status_code=status_code),
+                None,
+            ]
+            await cosmosdb_module.container_function_with_back_off(
+                function, max_retries, delay, max_delay
+            )
+            assert function.call_count == 2
+
+        # other http errors are not
+        for status_code in (400, 413):
+            function.reset_mock()
+            function.side_effect = exceptions.CosmosHttpResponseError(
+                status_code=status_code
+            )
+            with pytest.raises(exceptions.CosmosHttpResponseError):
+                await cosmosdb_module.container_function_with_back_off(
+                    function, max_retries, delay, max_delay
+                )
+            function.assert_called_once()
+
         function.reset_mock()
         function.side_effect = Exception("test exception")
 
@@ -262,6 +413,42 @@ class TestDateTimeHelper:
     def test_get_weeks(self):
         """Test get weeks"""
 
+    @time_machine.travel("2023-04-08")
+    def test_get_start_date(self):
+        """Test get start date"""
+        assert date_time_helper.get_start_date("all") is None
+        assert date_time_helper.get_start_date(0) == datetime.date(2023, 4, 8)
+        assert date_time_helper.get_start_date(6) == datetime.date(2023, 4, 2)
+
+
+class TestCheckpointHelper:
+    """Test checkpoint helper"""
+
+    @time_machine.travel("2023-04-08")
+    def test_get_checkpoint_date(self):
+        """Test get checkpoint date"""
+        assert checkpoint_helper.get_checkpoint_date(7) == "2023-03-31"
+        assert checkpoint_helper.get_checkpoint_date("all") == "2023-04-07"
+
+    def test_get_fingerprint(self):
+        """Test get fingerprint"""
+        transactions = [
+            {"symbol": "ABC", "date": "2023-04-01", "quantity": 1},
+            {"symbol": "ABC", "date": "2023-04-07", "quantity": 2},
+        ]
+        fingerprint = checkpoint_helper.get_fingerprint(
+            transactions, "EUR", "2023-04-06"
+        )
+        assert fingerprint == checkpoint_helper.get_fingerprint(
+            transactions[:1], "EUR", "2023-04-06"
+        )
+        assert fingerprint != checkpoint_helper.get_fingerprint(
+            transactions, "USD", "2023-04-06"
+        )
+        assert fingerprint != checkpoint_helper.get_fingerprint(
+            transactions, "EUR", "2023-04-07"
+        )
+
 
 class TestSchemas:
     """Test schemas"""
@@ -303,6 +490,28 @@ class TestUtils:
         unique_items = utils.get_unique_items(items, key_to_filter)
         assert not unique_items
 
+    def test_group_items(self):
+        """Test group items"""
+        items = [
+            {"date": "2023-03-27", "symbol": "a"},
+            {"date": "2023-03-28", "symbol": "b"},
+            {"date": "2023-03-27", "symbol": "b"},
+            {"date": "2023-03-27", "symbol": "a"},
+        ]
+        grouped_items = utils.group_items(items, "date")
+        assert list(grouped_items) == ["2023-03-27", "2023-03-28"]
+        assert grouped_items["2023-03-27"] == [items[0], items[2], items[3]]
+
+        grouped_items = utils.group_items(items, "date", "symbol")
+        assert list(grouped_items) == [
+            ("2023-03-27", "a"),
+            ("2023-03-28", "b"),
+            ("2023-03-27", "b"),
+        ]
+        assert grouped_items[("2023-03-27", "a")] == [items[0], items[3]]
+
+        assert not utils.group_items([], "date")
+
     def test_get_weighted_average(self):
         """Test get weighted average"""
         data = [1, 4]
@@ -390,6 +599,80 @@ class TestUtils:
         assert result is True
 
 
+class TestTimeSeriesHelper:
+    """Test time series helper"""
+
+    def test_to_columns(self):
+        """Test to columns"""
+        data = {
+            "Meta Data": {"2. Symbol": "ABC"},
+            "Time Series (Daily)": {
+                "2023-04-06": {"4. close": "2.5000", "7. dividend amount": "0.5"},
+                "2023-04-05": {"4. close": "1.5000", "7. dividend amount": "0.0"},
+            },
+        }
+
+        assert time_series_helper.to_columns(data) == {
+            "meta_data": {"2. Symbol": "ABC"},
+            "dates": ["2023-04-05", "2023-04-06"],
+            "columns": {"close": [1.5, 2.5], "dividend_amount": [0.0, 0.5]},
+        }
+
+    def test_filter_columns(self):
+        """Test filter columns"""
+        data = {
+            "meta_data": {},
+            "dates": ["2023-04-04", "2023-04-05", "2023-04-06"],
+            "columns": {"close": [1.0, 2.0, 3.0]},
+        }
+
+        assert time_series_helper.filter_columns(data, "2023-04-05") == {
+            "meta_data": {},
+            "dates": ["2023-04-05", "2023-04-06"],
+            "columns": {"close": [2.0, 3.0]},
+        }
+        assert time_series_helper.filter_columns(data, "2023-04-07")["dates"] == []
+
+    def test_covers(self):
+        """Test a time series covers the history since its cutoff"""
+        data = {"meta_data": {"cutoff": "2023-04-05"}}
+        assert time_series_helper.covers(data, "2023-04-05")
+        assert not time_series_helper.covers(data, "2023-04-04")
+        assert not time_series_helper.covers(data, None)
+        assert time_series_helper.covers({"meta_data": {}}, "2023-04-04")
+
+    def test_get_shared_cutoff(self):
+        """Test a new download keeps the history of the cached time series"""
+        data = {"meta_data": {"cutoff": "2023-04-05"}}
+        assert time_series_helper.get_shared_cutoff(None, "2023-04-06") == "2023-04-06"
+        assert time_series_helper.get_shared_cutoff(data, "2023-04-06") == "2023-04-05"
+        assert time_series_helper.get_shared_cutoff(data, None) is None
+
+    def test_get_shared_cutoff_full_history(self):
+        """Test a cached full history is not replaced by a shorter download"""
+        assert (
+            time_series_helper.get_shared_cutoff({"meta_data": {}}, "2023-04-06")
+            is None
+        )
+
+    def test_get_as_of_index(self):
+        """Test get as of index"""
+        dates = ["2023-03-24", "2023-03-28"]
+        assert time_series_helper.get_as_of_index(dates, "2023-03-23") is None
+        assert time_series_helper.get_as_of_index(dates, "2023-03-24") == 0
+        assert time_series_helper.get_as_of_index(dates, "2023-03-27") == 0
+        assert time_series_helper.get_as_of_index(dates, "2023-04-30") == 1
+        assert time_series_helper.get_as_of_index(dates, "2023-03-27", 3) == 0
+        assert time_series_helper.get_as_of_index(dates, "2023-03-27", 2) is None
+
+    def test_get_as_of_positions(self):
+        """Test get as of positions"""
+        dates = ["2023-03-24", "2023-03-27", "2023-03-28"]
+        positions = time_series_helper.get_as_of_positions(dates)
+        assert positions == [0, 0, 0, 1, 2]
+        assert time_series_helper.get_as_of_positions(["2023-03-24"]) == [0]
+
+
 class TestValidateJson:
     """Test validate json"""
 
@@ -410,3 +693,327 @@ class TestValidateJson:
         result = utils.validate_json(input_json, input_schema)
         assert result.status_code == 400
         assert result.get_body() == b'{"result": "Schema validation failed"}'
+
+
+class TestMarketDataHelper:
+    """Test market data helper"""
+
+    @patch("shared_code.cosmosdb_module.cosmosdb_container")
+    def test_read_market_data(self, cosmosdb_container_mock):
+        """Test read market data"""
+        container = cosmosdb_container_mock.return_value
+        container.read_item.return_value = {"id": "FX_DAILY_USD_EUR"}
+        assert market_data_helper.read_market_data("FX_DAILY_USD_EUR") == {
+            "id": "FX_DAILY_USD_EUR"
+        }
+
+        container.read_item.side_effect = exceptions.CosmosResourceNotFoundError()
+        assert market_data_helper.read_market_data("FX_DAILY_USD_EUR") is None
+
+        container.read_item.side_effect = exceptions.CosmosHttpResponseError()
+        assert market_data_helper.read_market_data("FX_DAILY_USD_EUR") is None
+
+    @time_machine.travel("2023-04-08")
+    def test_is_fresh(self):
+        """Test is fresh"""
+        assert market_data_helper.is_fresh({"updated": "2023-04-08"})
+        assert not market_data_helper.is_fresh({"updated": "2023-04-07"})
+
+
+class TestCompanyDataHelper:
+    """Test company data helper"""
+
+    @time_machine.travel("2023-05-31")
+    @patch("shared_code.cosmosdb_module.cosmosdb_container")
+    def test_write_company_data(self, cosmosdb_container_mock):
+        """Test write company data"""
+        item = company_data_helper.write_company_data(
+            "apple.com", {"name": "Apple", "domain": "apple.com", "symbol": "AAPL"}
+        )
+
+        assert item["id"] == "apple.com"
+        assert item["expiry"] == "2023-06-30"
+        assert item["name"] == "Apple"
+        assert item["banner"] is None
+        assert "symbol" not in item
+        cosmosdb_container_mock.assert_called_with("company_data")
+        cosmosdb_container_mock.return_value.upsert_item.assert_called_with(item)
+
+    @time_machine.travel("2023-05-31")
+    def test_is_fresh(self):
+        """Test is fresh"""
+        assert company_data_helper.is_fresh({"expiry": "2023-05-31"})
+        assert not company_data_helper.is_fresh({"expiry": "2023-05-30"})
+
+
+class TestFxHelper:
+    """Test fx helper"""
+
+    def test_get_pivot_urls(self):
+        """Test get pivot urls"""
+        assert fx_helper.get_base_currency("GBX") == ("GBP", 100)
+        assert fx_helper.get_base_currency("EUR") == ("EUR", 1)
+        assert fx_helper.get_pivot_urls("GBX", "USD") == [
+            "https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=GBP&to_symbol=USD&outputsize=full"
+        ]
+        assert len(fx_helper.get_pivot_urls("CHF", "EUR")) == 2
+        assert fx_helper.get_pivot_urls("GBX", "GBP") == []
+
+    def test_divide_rates(self):
+        """Test cross rates use the most recent rate on or before every date"""
+        from_data = {
+            "dates": ["2023-04-03", "2023-04-04", "2023-04-06"],
+            "columns": {"close": [2.0, 3.0, 4.0]},
+        }
+        to_data = {
+            "dates": ["2023-04-04", "2023-04-05"],
+            "columns": {"close": [0.5, 1.0]},
+        }
+
+        result = fx_helper.divide_rates("CHF", "GBX", from_data, to_data)
+
+        assert result["dates"] == ["2023-04-04", "2023-04-06"]
+        assert result["columns"]["close"] == [600.0, 400.0]
+        assert result["meta_data"]["3. To Symbol"] == "GBX"
+
+    def test_get_cross_rate(self):
+        """Test cross rates are cached per currency pair"""
+        fx_helper.cross_rates.clear()
+        url = fx_helper.get_pivot_url("EUR")
+        pivot_data = {url: {"dates": ["2023-04-04"], "columns": {"close": [1.1]}}}
+
+        result = fx_helper.get_cross_rate("USD", "EUR", pivot_data, "2023-04-01")
+        assert result["columns"]["close"] == pytest.approx([1 / 1.1])
+        cached = fx_helper.get_cross_rate("USD", "EUR", pivot_data, "2023-04-01")
+        assert cached is result
+
+        pivot_data[url] = {"dates": ["2023-04-05"], "columns": {"close": [1.0]}}
+        result = fx_helper.get_cross_rate("USD", "EUR", pivot_data, "2023-04-01")
+        assert result["columns"]["close"] == [1.0]
+
+
+class TestSyncHelper:
+    """Test sync helper"""
+
+    def test_get_document_id(self):
+        """Test document ids are the same for the same row"""
+        document_id = sync_helper.get_document_id(
+            "123", "stocks_held", "2023-04-08", "ABC"
+        )
+        assert document_id == sync_helper.get_document_id(
+            "123", "stocks_held", "2023-04-08", "ABC"
+        )
+        assert document_id != sync_helper.get_document_id(
+            "123", "stocks_held", "2023-04-08", "XYZ"
+        )
+
+    def test_get_changed_items(self):
+        """Test only new items and items with other content are changed"""
+        items = sync_helper.add_content_hash(
+            [{"id": "1", "value": 1}, {"id": "2", "value": 2}, {"id": "3", "value": 3}]
+        )
+        assert items[0]["hash"] == sync_helper.get_content_hash({"value": 1, "id": "x"})
+
+        existing = {"1": items[0]["hash"], "2": "outdated"}
+        assert sync_helper.get_changed_items(items, existing) == items[1:]
+
+
+class TestTimeSeriesCache:
+    """Test time series cache"""
+
+    data = {
+        "meta_data": {"2. Symbol": "ABC"},
+        "dates": ["2023-04-05", "2023-04-06"],
+        "columns": {"open": [1.0, 2.0], "close": [1.5, 2.5]},
+    }
+
+    def test_get_cache_path(self):
+        """Test get cache path"""
+        assert time_series_cache.get_cache_path(
+            "cache",
+            "https://www.alphavantage.co/query?function=TIME_SERIES_DAILY_ADJUSTED&symbol=BRK/B&outputsize=full",
+        ) == os.path.join("cache", "TIME_SERIES_DAILY_ADJUSTED_BRK_B.npz")
+        assert time_series_cache.get_cache_path(
+            "cache",
+            "https://www.alphavantage.co/query?function=FX_DAILY&from_symbol=USD&to_symbol=EUR&outputsize=full",
+        ) == os.path.join("cache", "FX_DAILY_USD_EUR.npz")
+
+    def test_save_and_load_time_series(self, tmp_path):
+        """Test save and load time series"""
+        path = str(tmp_path / "cache" / "ABC.npz")
+        assert time_series_cache.load_time_series(path) is None
+
+        time_series_cache.save_time_series(path, self.data)
+        assert time_series_cache.load_time_series(path) == self.data
+
+    @time_machine.travel("2023-04-08")
+    def test_is_recent(self):
+        """Test is recent"""
+        assert time_series_cache.is_recent(self.data)
+
+    @time_machine.travel("2024-04-08")
+    def test_is_not_recent(self):
+        """Test is not recent"""
+        assert not time_series_cache.is_recent(self.data)
+
+    def test_merge_time_series(self):
+        """Test merge time series"""
+        update = {
+            "meta_data": {"2. Symbol": "ABC", "3. Last Refreshed": "2023-04-07"},
+            "dates": ["2023-04-06", "2023-04-07"],
+            "columns": {"open": [2.0, 3.0], "close": [2.75, 3.5]},
+        }
+
+        assert time_series_cache.merge_time_series(self.data, update) == {
+            "meta_data": update["meta_data"],
+            "dates": ["2023-04-05", "2023-04-06", "2023-04-07"],
+            "columns": {"open": [1.0, 2.0, 3.0], "close": [1.5, 2.75, 3.5]},
+        }
+
+        # the cutoff of the cached history is kept
+        cached = {**self.data, "meta_data": {"cutoff": "2023-04-05"}}
+        result = time_series_cache.merge_time_series(cached, update)
+        assert result["meta_data"] == {**update["meta_data"], "cutoff": "2023-04-05"}
+
+    def test_merge_time_series_gap(self):
+        """Test merge time series with a gap"""
+        update = {
+            "meta_data": {},
+            "dates": ["2023-04-10"],
+            "columns": {"open": [3.0], "close": [3.5]},
+        }
+        assert time_series_cache.merge_time_series(self.data, update) is None
+
+    def test_get_cache_key(self):
+        """Test get cache key without a time series"""
+        assert time_series_cache.get_cache_key("https://foo.bar") is None
+
+
+class TestRateLimitHelper:
+    """Test rate limit helper"""
+
+    def setup_method(self):
+        """Start every test with full rate limit buckets"""
+        rate_limit_helper.buckets.clear()
+
+    @time_machine.travel("2023-04-08")
+    @patch("shared_code.rate_limit_helper.time.monotonic")
+    def test_reserve(self, monotonic_mock):
+        """Test calls are spread evenly over the minute"""
+        monotonic_mock.return_value = 0.0
+        assert rate_limit_helper.reserve("key", "free") == 0.0
+        assert rate_limit_helper.reserve("key", "free") == 12.0
+        assert rate_limit_helper.reserve("key", "free") == 24.0
+
+        monotonic_mock.return_value = 36.0
+        assert rate_limit_helper.reserve("key", "free") == 0.0
+        assert rate_limit_helper.get_remaining("key", "free") == {
+            "calls_now": 0,
+            "calls_today": 21,
+        }
+
+        monotonic_mock.return_value = 60.0
+        assert rate_limit_helper.get_remaining("key", "free") == {
+            "calls_now": 1,
+            "calls_today": 21,
+        }
+
+    @patch("shared_code.rate_limit_helper.time.monotonic")
+    def test_daily_limit(self, monotonic_mock):
+        """Test the daily limit of a plan"""
+        with time_machine.travel("2023-04-08"):
+            for minute in range(25):
+                monotonic_mock.return_value = minute * 60.0
+                assert rate_limit_helper.reserve("key", "free") == 0.0
+            with pytest.raises(Exception, match="Daily api call limit reached"):
+                rate_limit_helper.reserve("key", "free")
+
+        with time_machine.travel("2023-04-09"):
+            monotonic_mock.return_value = 25 * 60.0
+            assert rate_limit_helper.reserve("key", "free") == 0.0
+
+    def test_premium_plan(self):
+        """Test premium plans have no daily limit"""
+        assert rate_limit_helper.get_remaining("key", "premium_75") == {
+            "calls_now": 1,
+            "calls_today": None,
+        }
+
+    def test_get_concurrency(self):
+        """Test the calls in flight follow the rate of the plan"""
+        assert rate_limit_helper.get_concurrency("free") == 1
+        assert rate_limit_helper.get_concurrency("premium_75") == 2
+        assert rate_limit_helper.get_concurrency("premium_1200") == 20
+
+    @patch("shared_code.rate_limit_helper.time.monotonic")
+    def test_default_plan(self, monotonic_mock):
+        """Test users without a plan setting are paced like a free key without a daily limit"""
+        plan = rate_limit_helper.DEFAULT_PLAN
+        monotonic_mock.return_value = 0.0
+        assert rate_limit_helper.reserve("key", plan) == 0.0
+        assert rate_limit_helper.reserve("key", plan) == 12.0
+
+        for minute in range(1, 30):
+            monotonic_mock.return_value = minute * 60.0
+            assert rate_limit_helper.reserve("key", plan) == 0.0
+        assert (
+            plan not in schemas.user_data()["properties"]["alpha_vantage_plan"]["enum"]
+        )
+
+
+class TestClaimCheckHelper:
+    """Test claim check helper"""
+
+    items = [{"id": str(i), "value": "x" * 100} for i in range(1000)]
+
+    def test_disabled(self, monkeypatch):
+        """Test values are passed inline without a store"""
+        monkeypatch.delenv("CLAIM_CHECK_DIR", raising=False)
+        assert claim_check_helper.check_in(self.items) is self.items
+        assert claim_check_helper.check_out(self.items) is self.items
+
+        with pytest.raises(Exception, match="not configured"):
+            claim_check_helper.check_out({"claim_check": "2023-04-08/abc.json"})
+
+    @time_machine.travel("2023-04-08")
+    def test_check_in_and_out(self, tmp_path, monkeypatch):
+        """Test large values are stored and small values are passed inline"""
+        monkeypatch.setenv("CLAIM_CHECK_DIR", str(tmp_path))
+
+        assert claim_check_helper.check_in(self.items[:2]) == self.items[:2]
+
+        reference = claim_check_helper.check_in(self.items)
+        assert claim_check_helper.is_reference(reference)
+        assert reference["claim_check"].startswith("2023-04-08/")
+        assert claim_check_helper.check_out(reference) == self.items
+        assert claim_check_helper.check_out_values({"a": reference, "b": 1}) == {
+            "a": self.items,
+            "b": 1,
+        }
+
+    def test_check_in_batches(self, tmp_path, monkeypatch):
+        """Test check in batches"""
+        monkeypatch.setenv("CLAIM_CHECK_DIR", str(tmp_path))
+
+        batches = claim_check_helper.check_in_batches(self.items, 600)
+        assert len(batches) == 2
+        assert all(claim_check_helper.is_reference(batch) for batch in batches)
+        assert [claim_check_helper.check_out(batch) for batch in batches] == [
+            self.items[:600],
+            self.items[600:],
+        ]
+        assert claim_check_helper.check_in_batches([], 600) == []
+
+    def test_delete_expired(self, tmp_path, monkeypatch):
+        """Test claim checks older than the retention period are deleted"""
+        monkeypatch.setenv("CLAIM_CHECK_DIR", str(tmp_path))
+        with time_machine.travel("2023-04-01"):
+            old_reference = claim_check_helper.check_in(self.items)
+        with time_machine.travel("2023-04-07"):
+            claim_check_helper.check_in(self.items)
+        assert (tmp_path / old_reference["claim_check"]).exists()
+
+        with time_machine.travel("2023-04-09"):
+            claim_check_helper.check_in(self.items)
+        assert not (tmp_path / "2023-04-01").exists()
+        assert (tmp_path / "2023-04-07").exists()
@@ -0,0 +1,80 @@
+"""Test the sync_cosmosdb_items function."""
+
+import json
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+
+import pytest
+import time_machine
+from azure.cosmos.aio import ContainerProxy
+
+from shared_code import sync_helper
+from sync_cosmosdb_items import main
+
+new_items = sync_helper.add_content_hash(
+    [
+        {"id": "1", "date": "2023-04-07", "value": 1},
+        {"id": "2", "date": "2023-04-08", "value": 2},
+        {"id": "3", "date": "2023-04-08", "value": 3},
+    ]
+)
+
+
+async def mock_query(items: list):
+    """Mock the async pages of a query"""
+    for item in items:
+        yield item
+
+
+@time_machine.travel("2023-04-08")
+@pytest.mark.asyncio()
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
+async def test_sync(cosmosdb_container_mock):
+    """Test only changed items are upserted and items that are gone are deleted."""
+    container = MagicMock(spec=ContainerProxy)
+    container.query_items.return_value = mock_query(
+        [
+            {"id": "1", "hash": new_items[0]["hash"]},
+            {"id": "2", "hash": "outdated"},
+            {"id": "4", "hash": "removed"},
+        ]
+    )
+    container.upsert_item = AsyncMock()
+    container.delete_item = AsyncMock()
+    cosmosdb_container_mock.return_value = container
+
+    response = await main(["totals", [new_items[:2], new_items[2:]], 7, "123"])
+
+    assert json.loads(response)["items"] == 3
+    cosmosdb_container_mock.assert_called_with("totals")
+    container.query_items.assert_called_once_with(
+        query="SELECT c.id, c.hash FROM c WHERE c.date >= @start_date and c.date <= @end_date and c.userid = @userid",
+        parameters=[
+            {"name": "@start_date", "value": "2023-04-01"},
+            {"name": "@end_date", "value": "2023-04-08"},
+            {"name": "@userid", "value": "123"},
+        ],
+    )
+    assert [c.args[0]["id"] for c in container.upsert_item.call_args_list] == [
+        "2",
+        "3",
+    ]
+    container.delete_item.assert_called_once_with(
+        {"id": "4"}, partition_key="4", response_hook=ANY
+    )
+
+
+@pytest.mark.asyncio()
+@patch("shared_code.cosmosdb_module.cosmosdb_async_container")
+async def test_unchanged(cosmosdb_container_mock):
+    """Test nothing is written when no item changed."""
+    container = MagicMock(spec=ContainerProxy)
+    container.query_items.return_value = mock_query(
+        [{"id": item["id"], "hash": item["hash"]} for item in new_items]
+    )
+    cosmosdb_container_mock.return_value = container
+
+    response = await main(["totals", [new_items], "all", "123"])
+
+    assert json.loads(response)["items"] == 0
+    container.upsert_item.assert_not_called()
+    container.delete_item.assert_not_called()